@@ -1,8 +1,10 @@
 from __future__ import annotations
 
 import base64
+import os
 import tempfile
 import time
+import uuid
 from pathlib import Path
 
 import cv2
@@ -10,22 +12,37 @@ import numpy as np
 import streamlit as st
 from PIL import Image
 from streamlit_image_coordinates import streamlit_image_coordinates
-
+from streamlit_webrtc import WebRtcMode, webrtc_streamer
+
+from utils.focus import FocusOptions, process_video
+from utils.live import LiveFocusProcessor
+from utils.metrics import MetricsExporter, default_metrics_path
+from utils.models import ModelPool
+from utils.motion import FlowTracker, fast_motion_fallback
+from utils.segments import process_video_segmented
+from utils.sidecar import DetectionSidecar, find_sidecar, sidecar_path
+from utils.timing import StageTimer
 from utils.tracking import (
-    apply_focus_effect,
     choose_target_from_click,
     draw_boxes,
-    enhance_low_light,
     find_bbox_for_track,
-    find_bbox_and_id_by_proximity,
+    find_bbox_and_id_by_overlap,
     get_candidate_boxes,
-    load_model,
     AppearanceMatcher,
+    Detections,
+    EmbeddingCache,
+    FocusCompositor,
+    GrabCutSegmenter,
+    LowLightEnhancer,
 )
-from utils.video import iter_frames, make_video_writer, open_video, read_frame_at
+from utils.uploads import UPLOAD_CACHE_DIR, evict_uploads, spool_upload
+from utils.video import CameraStream, FrameCache, FrameReader, VideoMeta
 
 # ─── Page Config ─────────────────────────────────────────────────────────────
 LOGO_PATH = Path(__file__).parent / "assets" / "logo.png"
+FRAME_CACHE_BYTES = 512 * 1024 * 1024
+PREFETCH_FRAMES = 8
+UPLOAD_CACHE_BYTES = 8 * 1024 * 1024 * 1024
 
 st.set_page_config(
     page_title="Bulls-Eye",
@@ -426,6 +443,14 @@ button[kind="primary"]:hover {
     color: var(--text-secondary);
 }
 
+.status-pill.latency {
+    background: rgba(139, 148, 158, 0.05);
+    border-color: var(--border);
+    color: var(--text-muted);
+    font-family: 'JetBrains Mono', monospace;
+    font-weight: 500;
+}
+
 .pulse-dot {
     width: 6px;
     height: 6px;
@@ -605,10 +630,186 @@ def init_state() -> None:
             st.session_state[key] = value
 
 
+@st.cache_resource
+def get_model_pool() -> ModelPool:
+    return ModelPool("yolov8n.pt")
+
+
+def ensure_model_lease(state_key: str, reset: bool = False):
+    # Dropping the lease from session state (or the session itself) hands the model back to the pool.
+    lease = st.session_state.get(state_key)
+    if lease is None:
+        lease = get_model_pool().lease()
+        st.session_state[state_key] = lease
+    elif reset:
+        lease.reset_tracker()
+    return lease.model
+
+
 def ensure_preview_model(reset: bool = False):
-    if reset or "preview_model" not in st.session_state:
-        st.session_state.preview_model = load_model("yolov8n.pt")
-    return st.session_state.preview_model
+    return ensure_model_lease("preview_model", reset=reset)
+
+
+def spool_session_upload(uploaded):
+    upload_id = getattr(uploaded, "file_id", None) or (uploaded.name, uploaded.size)
+    spooled = st.session_state.get("spooled_upload")
+    if spooled is None or spooled[0] != upload_id or not Path(spooled[2]).exists():
+        video_key, video_path = spool_upload(
+            uploaded.getbuffer(),
+            suffix=Path(uploaded.name).suffix,
+            cache_dir=UPLOAD_CACHE_DIR,
+            max_bytes=UPLOAD_CACHE_BYTES,
+        )
+        spooled = (upload_id, video_key, video_path)
+        st.session_state.spooled_upload = spooled
+    else:
+        # Keeps the file inside evict_uploads' grace window while this session still has it open.
+        os.utime(spooled[2])
+    return spooled[1], spooled[2]
+
+
+def ensure_frame_reader(video_key, video_path: str) -> FrameReader:
+    reader = st.session_state.get("frame_reader")
+    if reader is None or st.session_state.get("frame_reader_key") != video_key:
+        if reader is not None:
+            reader.release()
+        reader = FrameReader(video_path, cache=get_frame_cache(), video_key=video_key)
+        st.session_state.frame_reader = reader
+        st.session_state.frame_reader_key = video_key
+    return reader
+
+
+def ensure_preview_sidecar(video_key, options: FocusOptions, frame_index: int):
+    path = find_sidecar(video_key, options, frame_index)
+    if path is None:
+        return None
+    sidecar = st.session_state.get("preview_sidecar")
+    if sidecar is None or sidecar.path != path:
+        sidecar = DetectionSidecar.open(path)
+        st.session_state.preview_sidecar = sidecar
+    return sidecar if sidecar is not None and frame_index in sidecar else None
+
+
+def ensure_camera_stream() -> CameraStream:
+    stream = st.session_state.get("camera_stream")
+    if stream is None or not stream.alive:
+        stream = CameraStream(0)
+        st.session_state.camera_stream = stream
+        st.session_state.camera_seq = 0
+    return stream
+
+
+def release_camera_stream() -> None:
+    stream = st.session_state.pop("camera_stream", None)
+    if stream is not None:
+        stream.release()
+
+
+def ensure_compositor(state_key: str, frame: np.ndarray):
+    entry = st.session_state.get(state_key)
+    if entry is None or entry[0].shape != frame.shape:
+        height, width = frame.shape[:2]
+        compositor = FocusCompositor(VideoMeta(width=width, height=height, fps=0.0, frame_count=0), buffers=1)
+        entry = (compositor, compositor.acquire())
+        st.session_state[state_key] = entry
+    return entry
+
+
+def ensure_segmenter(state_key: str) -> GrabCutSegmenter:
+    if state_key not in st.session_state:
+        st.session_state[state_key] = GrabCutSegmenter()
+    return st.session_state[state_key]
+
+
+def ensure_flow_tracker(state_key: str) -> FlowTracker:
+    if state_key not in st.session_state:
+        st.session_state[state_key] = FlowTracker()
+    return st.session_state[state_key]
+
+
+def reset_flow_tracker(state_key: str) -> None:
+    # LK state from before a seek or a new target would compute flow between unrelated frames.
+    st.session_state.pop(state_key, None)
+
+
+def ensure_enhancer(state_key: str, fast: bool, luma_gate) -> LowLightEnhancer:
+    enhancer = st.session_state.get(state_key)
+    if enhancer is None or (enhancer.fast, enhancer.luma_gate) != (fast, luma_gate):
+        enhancer = LowLightEnhancer(fast=fast, luma_gate=luma_gate)
+        st.session_state[state_key] = enhancer
+    return enhancer
+
+
+def lowlight_timing_caption(enhancer: LowLightEnhancer) -> str:
+    parts = [
+        f"{name.split('.', 1)[1]} {enhancer.timer.mean_ms(name):.1f} ms"
+        for name in ("lowlight.gate", "lowlight.clahe", "lowlight.denoise")
+        if enhancer.timer.counts.get(name)
+    ]
+    parts.append(f"skipped {enhancer.skipped}/{enhancer.frames} bright frames")
+    return "Low-light · " + " · ".join(parts)
+
+
+def stage_timing_caption(timings) -> str:
+    return " · ".join(f"{name} {stats['ms_per_call']:.1f} ms" for name, stats in sorted(timings.items()))
+
+
+LATENCY_STAGES = (
+    "decode",
+    "capture",
+    "lowlight",
+    "detect",
+    "detect.roi",
+    "propagate",
+    "match",
+    "segment",
+    "effect",
+    "draw",
+    "transfer",
+)
+
+
+def ensure_stage_timer(state_key: str) -> StageTimer:
+    if state_key not in st.session_state:
+        st.session_state[state_key] = StageTimer()
+    return st.session_state[state_key]
+
+
+def latency_hud_html(timer: StageTimer) -> str:
+    timings = timer.summary()
+    parts = [
+        f"{name} {timings[name]['p50_ms']:.0f}/{timings[name]['p95_ms']:.0f}"
+        for name in LATENCY_STAGES
+        if name in timings and "p95_ms" in timings[name]
+    ]
+    if not parts:
+        return ""
+    return f'<span class="status-pill latency" title="Rolling p50/p95 per stage, ms">⏱ {" · ".join(parts)} ms</span>'
+
+
+def drift_caption(drift) -> str:
+    return (
+        f"Stride drift: mean IoU {drift['mean_iou']:.2f} · min {drift['min_iou']:.2f} "
+        f"over {drift['checks']} re-anchors"
+    )
+
+
+@st.cache_resource
+def get_metrics_exporter(path: str, fmt: str) -> MetricsExporter:
+    # Shared across sessions so every session's source lands in the same Prometheus textfile.
+    return MetricsExporter(path, fmt=fmt)
+
+
+def metrics_source(kind: str) -> str:
+    # The exporter is shared, so each session reports under its own source instead of overwriting the others.
+    if "metrics_session" not in st.session_state:
+        st.session_state.metrics_session = uuid.uuid4().hex[:8]
+    return f"{kind}-{st.session_state.metrics_session}"
+
+
+@st.cache_resource
+def get_frame_cache() -> FrameCache:
+    return FrameCache(max_bytes=FRAME_CACHE_BYTES)
 
 
 @st.cache_resource
@@ -622,6 +823,94 @@ def get_appearance_matcher():
     return matcher
 
 
+def render_webrtc_live(
+    options: FocusOptions,
+    matcher,
+    matcher_mode: str,
+    show_boxes: bool,
+    latency_hud: bool,
+    metrics_exporter,
+) -> None:
+    # Frames never pass through this script: the processor runs inside webrtc's callback thread and the
+    # script only reruns on user input (snapshot, click, sidebar change).
+    pool = get_model_pool()
+    live_source = metrics_source("live")
+    ctx = webrtc_streamer(
+        key="live-webrtc",
+        mode=WebRtcMode.SENDRECV,
+        video_processor_factory=lambda: LiveFocusProcessor(pool, matcher, options, show_boxes, metrics_exporter, live_source),
+        media_stream_constraints={"video": True, "audio": False},
+        async_processing=True,
+    )
+    processor = ctx.video_processor
+    st.markdown('<div class="main-title">LIVE CAMERA</div>', unsafe_allow_html=True)
+    if processor is None:
+        st.session_state.live_snapshot = None
+        st.caption("Press START above to stream your browser camera.")
+        return
+    processor.configure(options, show_boxes, metrics_exporter, live_source)
+
+    track_id = processor.track_id
+    if track_id is not None:
+        track_status_html = f'<span class="status-pill tracking"><span class="pulse-dot green"></span> Tracking ID {track_id}</span>'
+    else:
+        track_status_html = '<span class="status-pill idle"><span class="pulse-dot amber"></span> No target</span>'
+    matcher_html = f'<span class="status-pill matcher">Matcher: {matcher_mode}</span>' if options.appearance_match else ""
+    latency_html = latency_hud_html(processor.timer) if latency_hud else ""
+    drift = processor.target.drift.summary()
+    if drift:
+        latency_html += f'<span class="status-pill latency" title="{drift_caption(drift)}">IoU {drift["mean_iou"]:.2f}</span>'
+    st.markdown(
+        f"""
+        <div class="status-container">
+            {track_status_html}
+            <span class="status-pill frame">📷 WebRTC</span>
+            {matcher_html}
+            {latency_html}
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    scol1, scol2 = st.columns(2)
+    if scol1.button("📸 Snapshot to select", use_container_width=True) or st.session_state.get("live_snapshot") is None:
+        st.session_state.live_snapshot = processor.snapshot()
+        # A fresh component key per snapshot, so a click on the previous image is not replayed on this one.
+        st.session_state.live_snapshot_seq = st.session_state.get("live_snapshot_seq", 0) + 1
+    if scol2.button("✖ Clear target", use_container_width=True, disabled=track_id is None):
+        processor.clear()
+        st.rerun()
+
+    snapshot = st.session_state.get("live_snapshot")
+    if snapshot is None:
+        st.caption("Waiting for the first frame…")
+        return
+
+    st.markdown('<div class="preview-wrapper">', unsafe_allow_html=True)
+    coords = streamlit_image_coordinates(
+        Image.fromarray(cv2.cvtColor(draw_boxes(snapshot.frame, snapshot.detections), cv2.COLOR_BGR2RGB)),
+        key=f"live-snapshot-click-{st.session_state.live_snapshot_seq}",
+    )
+    st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown('<div class="click-hint">Click a subject on the snapshot to track it in the live stream</div>', unsafe_allow_html=True)
+
+    if not coords:
+        return
+    if st.session_state.lock_target:
+        st.info("🔒 Target is locked. Disable **Lock target** in the sidebar to switch focus.")
+        return
+    click_key = (st.session_state.live_snapshot_seq, int(coords["x"]), int(coords["y"]))
+    if st.session_state.get("live_last_click") == click_key:
+        return
+    st.session_state.live_last_click = click_key
+    selection = choose_target_from_click(snapshot.detections, click_key[1], click_key[2])
+    if selection is None:
+        st.warning("No detection under the click. Please click directly on the object.")
+        return
+    processor.select(snapshot, selection)
+    st.success(f"🎯 Now tracking ID **{selection.track_id}**")
+
+
 init_state()
 check_lap()
 
@@ -675,12 +964,9 @@ with st.sidebar:
     st.markdown('<div class="section-label"><span class="sec-icon">🎬</span> PLAYBACK</div>', unsafe_allow_html=True)
 
     if uploaded is not None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded.name).suffix) as tmp:
-            tmp.write(uploaded.getbuffer())
-            video_path = tmp.name
-
-        cap, meta = open_video(video_path)
-        cap.release()
+        video_key, video_path = spool_session_upload(uploaded)
+        frame_reader = ensure_frame_reader(video_key, video_path)
+        meta = frame_reader.meta
 
         start_frame = st.slider(
             "Start frame",
@@ -708,18 +994,29 @@ with st.sidebar:
         reset_clicked = bcol3.button("↺ Reset", disabled=not st.session_state.preview_started, use_container_width=True)
     elif is_live_mode:
         # Live camera controls
+        live_transport = st.radio(
+            "Camera",
+            ["Browser (WebRTC)", "Server webcam"],
+            help="Browser streams your camera over WebRTC and processes frames as they arrive; "
+            "server webcam reads the camera attached to the machine running the app.",
+        )
+        use_webrtc = live_transport == "Browser (WebRTC)"
+        if use_webrtc and st.session_state.get("live_playing", False):
+            st.session_state.live_playing = False
+            st.session_state.live_model = None
+            release_camera_stream()
         lcol1, lcol2 = st.columns(2)
         with lcol1:
             start_cam = st.button(
                 "📷 Start Camera",
-                disabled=st.session_state.get("live_playing", False),
+                disabled=use_webrtc or st.session_state.get("live_playing", False),
                 use_container_width=True,
                 type="primary",
             )
         with lcol2:
             stop_cam = st.button(
                 "⏹ Stop Camera",
-                disabled=not st.session_state.get("live_playing", False),
+                disabled=use_webrtc or not st.session_state.get("live_playing", False),
                 use_container_width=True,
             )
         if start_cam:
@@ -730,10 +1027,13 @@ with st.sidebar:
             st.session_state.target_embedding = None
             st.session_state.live_last_click = None
             st.session_state.live_pending_click = None
+            reset_flow_tracker("live_flow")
             st.rerun()
         if stop_cam:
             st.session_state.live_playing = False
             st.session_state.live_model = None
+            reset_flow_tracker("live_flow")
+            release_camera_stream()
             st.rerun()
 
         # Placeholder values for video controls (unused in live mode)
@@ -744,6 +1044,7 @@ with st.sidebar:
         play_pause = False
         reset_clicked = False
         video_path = None
+        frame_reader = None
         meta = None
     else:
         start_frame = 0
@@ -753,17 +1054,29 @@ with st.sidebar:
         play_pause = False
         reset_clicked = False
         video_path = None
+        frame_reader = None
         meta = None
 
     # ── Tracking Section ──
     st.markdown('<div class="section-label"><span class="sec-icon">🎯</span> TRACKING</div>', unsafe_allow_html=True)
     show_boxes = st.checkbox("Show detections", value=True)
+    latency_hud = st.checkbox("Latency HUD", value=False, help="Show rolling p50/p95 per stage in the status bar.")
     lock_target_widget = st.checkbox(
         "Lock target (ignore clicks)",
         value=st.session_state.lock_target,
         key="lock_target_widget",
     )
     st.session_state.lock_target = lock_target_widget
+    if lock_target_widget:
+        roi_detect = st.checkbox(
+            "Detect around target",
+            value=True,
+            help="While locked, run YOLO on a crop around the subject, sized to it, when saving and in browser live mode.",
+        )
+        roi_full_every = st.slider("Full-frame every", min_value=2, max_value=60, value=15, disabled=not roi_detect)
+    else:
+        roi_detect = False
+        roi_full_every = 15
 
     appearance_match = st.checkbox("Appearance matching", value=True)
     if appearance_match:
@@ -776,11 +1089,35 @@ with st.sidebar:
         )
     else:
         appearance_strictness = 0.55
+    detect_stride = st.slider(
+        "Detection stride",
+        min_value=1,
+        max_value=8,
+        value=1,
+        help="Run YOLO every Nth frame when saving and in browser live mode; "
+        "the target box is carried between detections by a motion model.",
+    )
 
     # ── Enhancement Section ──
     st.markdown('<div class="section-label"><span class="sec-icon">⚡</span> ENHANCEMENT</div>', unsafe_allow_html=True)
     low_light = st.checkbox("Low-light enhance", value=False)
+    if low_light:
+        fast_enhance = st.checkbox(
+            "Fast enhance",
+            value=False,
+            help="Bilateral denoise instead of non-local means, and skip frames that are already bright.",
+        )
+        luma_gate = st.slider("Brightness gate", min_value=60, max_value=200, value=110, step=5) if fast_enhance else None
+    else:
+        fast_enhance = False
+        luma_gate = None
     adaptive_blur = st.checkbox("GrabCut mask", value=False, help="Sharper subject edges, slower processing.")
+    blur_ksize = st.slider("Blur strength", min_value=15, max_value=75, value=35, step=2)
+    fast_blur = st.checkbox("Fast blur", value=False, help="Blur a downscaled copy and upsample it.")
+    if fast_blur:
+        blur_downscale = st.slider("Blur downscale", min_value=2, max_value=8, value=4, step=1)
+    else:
+        blur_downscale = 1
     fast_motion = st.checkbox("Fast motion mode", value=False)
     if fast_motion:
         fast_motion_tolerance = st.slider("Motion tolerance", min_value=1.0, max_value=3.0, value=2.0, step=0.25)
@@ -790,6 +1127,39 @@ with st.sidebar:
     # ── Output Section ──
     st.markdown('<div class="section-label"><span class="sec-icon">💾</span> OUTPUT</div>', unsafe_allow_html=True)
     save_output = st.checkbox("Save output video", value=True)
+    detect_batch = st.slider(
+        "Detection batch",
+        min_value=1,
+        max_value=16,
+        value=1,
+        help="Frames per YOLO call when saving. Above 1, detections are tracked offline with the same ByteTrack settings.",
+    )
+    parallel_segments = st.slider(
+        "Parallel segments",
+        min_value=1,
+        max_value=max(1, os.cpu_count() or 1),
+        value=1,
+        disabled=not appearance_match,
+        help="Split long videos into segments processed in separate worker processes, then join them. "
+        "Needs appearance matching to pick the target up again in later segments.",
+    )
+    reuse_detections = st.checkbox(
+        "Reuse detections",
+        value=True,
+        help="Save per-frame detections next to the upload and reuse them when only effect settings change.",
+    )
+    if reuse_detections and parallel_segments > 1 and appearance_match:
+        st.caption("Parallel segments detect from scratch when saving; saved detections are only reused in the preview.")
+    metrics_format = st.selectbox(
+        "Metrics export",
+        ["Off", "JSON lines", "Prometheus"],
+        help="Write per-stage latency to a local file for dashboards or a node-exporter textfile collector.",
+    )
+    metrics_exporter = None
+    if metrics_format != "Off":
+        fmt = "jsonl" if metrics_format == "JSON lines" else "prometheus"
+        metrics_path = st.text_input("Metrics file", value=default_metrics_path(fmt))
+        metrics_exporter = get_metrics_exporter(metrics_path, fmt)
 
     # ── Close collapsible wrapper ──
     st.markdown('</div>', unsafe_allow_html=True)
@@ -823,9 +1193,32 @@ if is_live_mode:
 
     # ── Live model (persisted in session state) ──
     def ensure_live_model(reset=False):
-        if reset or st.session_state.live_model is None:
-            st.session_state.live_model = load_model("yolov8n.pt")
-        return st.session_state.live_model
+        return ensure_model_lease("live_model", reset=reset)
+
+    if use_webrtc:
+        render_webrtc_live(
+            FocusOptions(
+                low_light=low_light,
+                fast_enhance=fast_enhance,
+                luma_gate=luma_gate,
+                grabcut=adaptive_blur,
+                fast_motion=fast_motion,
+                fast_motion_tolerance=fast_motion_tolerance,
+                appearance_match=appearance_match,
+                appearance_strictness=appearance_strictness,
+                blur_ksize=blur_ksize,
+                blur_downscale=blur_downscale,
+                detect_stride=detect_stride,
+                roi_detect=roi_detect,
+                roi_full_every=roi_full_every,
+            ),
+            matcher,
+            matcher_mode,
+            show_boxes,
+            latency_hud,
+            metrics_exporter,
+        )
+        st.stop()
 
     # ── Start / Stop controls ──
     if not st.session_state.live_playing:
@@ -851,47 +1244,59 @@ if is_live_mode:
     # ── Active live stream ──
     model_live = ensure_live_model()
 
-    # Capture a single frame from the webcam
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        st.error("❌ Could not open webcam. Make sure your camera is connected and not in use by another app.")
-        st.session_state.live_playing = False
-        st.stop()
+    live_timer = ensure_stage_timer("live_timer")
 
-    ok, frame = cap.read()
-    cap.release()
+    # Newest frame from the session's background grabber; waits only if the camera hasn't delivered one yet.
+    with live_timer.stage("capture"):
+        try:
+            camera = ensure_camera_stream()
+        except ValueError as exc:
+            st.error(f"❌ {exc}")
+            st.session_state.live_playing = False
+            st.stop()
+        seq, frame = camera.read(after=st.session_state.camera_seq)
 
-    if not ok:
+    if frame is None:
         st.error("❌ Could not read frame from webcam.")
+        release_camera_stream()
         st.session_state.live_playing = False
         st.stop()
+    st.session_state.camera_seq = seq
 
     # ── Apply low-light enhancement ──
-    tracking_frame = enhance_low_light(frame) if low_light else frame
+    live_enhancer = ensure_enhancer("live_enhancer", fast_enhance, luma_gate) if low_light else None
+    with live_timer.stage("lowlight"):
+        tracking_frame = live_enhancer(frame) if live_enhancer is not None else frame
 
     # ── Run YOLO tracking ──
-    results = model_live.track(
-        tracking_frame,
-        persist=True,
-        tracker="bytetrack.yaml",
-        verbose=False,
-    )
-    result = results[0]
+    with live_timer.stage("detect"):
+        results = model_live.track(
+            tracking_frame,
+            persist=True,
+            tracker="bytetrack.yaml",
+            verbose=False,
+        )
+        detections = Detections.from_result(results[0])
+    match_started = time.perf_counter()
+
+    frame_embeddings = EmbeddingCache()
 
     # ── Track selected target ──
     selected_track_id = st.session_state.get("live_selected_track_id")
     bbox = None
 
     if selected_track_id is not None:
-        bbox = find_bbox_for_track(result, selected_track_id)
+        bbox = find_bbox_for_track(detections, selected_track_id)
 
-        # Fast-motion fallback: proximity search
+        # Fast-motion fallback: optical flow from the last box, then proximity search
         if bbox is None and fast_motion and st.session_state.get("live_target_bbox") is not None:
-            last_bbox = st.session_state.live_target_bbox
-            bbox_w = max(1, last_bbox[2] - last_bbox[0])
-            bbox_h = max(1, last_bbox[3] - last_bbox[1])
-            max_dist = max(bbox_w, bbox_h) * fast_motion_tolerance
-            bbox, new_id = find_bbox_and_id_by_proximity(result, last_bbox, max_dist)
+            bbox, new_id = fast_motion_fallback(
+                detections,
+                tracking_frame,
+                st.session_state.live_target_bbox,
+                ensure_flow_tracker("live_flow"),
+                fast_motion_tolerance,
+            )
             if new_id is not None:
                 st.session_state.live_selected_track_id = new_id
                 selected_track_id = new_id
@@ -900,36 +1305,58 @@ if is_live_mode:
     target_embedding = st.session_state.get("target_embedding")
     if appearance_match and matcher is not None and target_embedding is not None:
         if bbox is not None:
-            current_emb = matcher.embed_crop(tracking_frame, bbox)
+            current_emb = matcher.embed_crop(tracking_frame, bbox, cache=frame_embeddings)
             sim = matcher.cosine_similarity(current_emb, target_embedding) if current_emb is not None else -1.0
             if sim < keep_threshold:
-                candidates = get_candidate_boxes(result, max_candidates=5)
-                best_bbox, best_id, best_sim = matcher.best_match(tracking_frame, candidates, target_embedding)
+                candidates = get_candidate_boxes(detections, max_candidates=5)
+                best_bbox, best_id, best_sim = matcher.best_match(
+                    tracking_frame, candidates, target_embedding, cache=frame_embeddings
+                )
                 if best_bbox is not None and best_sim >= switch_threshold:
                     bbox = best_bbox
                     st.session_state.live_selected_track_id = best_id
                     selected_track_id = best_id
         else:
-            candidates = get_candidate_boxes(result, max_candidates=5)
-            best_bbox, best_id, best_sim = matcher.best_match(tracking_frame, candidates, target_embedding)
+            candidates = get_candidate_boxes(detections, max_candidates=5)
+            best_bbox, best_id, best_sim = matcher.best_match(
+                tracking_frame, candidates, target_embedding, cache=frame_embeddings
+            )
             if best_bbox is not None and best_sim >= switch_threshold:
                 bbox = best_bbox
                 st.session_state.live_selected_track_id = best_id
                 selected_track_id = best_id
+    live_timer.add("match", time.perf_counter() - match_started)
 
     # ── Apply focus effect ──
+    compositor, compose_out = ensure_compositor("live_compositor", tracking_frame)
     preview_frame = tracking_frame
     if selected_track_id is not None and bbox is not None:
-        preview_frame = apply_focus_effect(tracking_frame, bbox, use_grabcut=adaptive_blur)
+        roi_mask = None
+        if adaptive_blur:
+            with live_timer.stage("segment"):
+                roi_mask = ensure_segmenter("live_segmenter").segment(tracking_frame, bbox, selected_track_id)
+        with live_timer.stage("effect"):
+            preview_frame = compositor.compose(
+                tracking_frame,
+                bbox,
+                compose_out,
+                roi_mask=roi_mask,
+                blur_ksize=blur_ksize,
+                blur_downscale=blur_downscale,
+            )
         st.session_state.live_target_bbox = bbox
+        if fast_motion:
+            ensure_flow_tracker("live_flow").observe(tracking_frame, bbox)
     else:
         st.session_state.live_target_bbox = None
 
     # ── Draw detection boxes ──
     if show_boxes:
-        preview_frame = draw_boxes(preview_frame, result)
+        with live_timer.stage("draw"):
+            preview_frame = draw_boxes(preview_frame, detections, inplace=preview_frame is compose_out)
 
-    rgb = cv2.cvtColor(preview_frame, cv2.COLOR_BGR2RGB)
+    transfer_started = time.perf_counter()
+    rgb = compositor.to_rgb(preview_frame)
     pil_img = Image.fromarray(rgb)
 
     # ── Status bar ──
@@ -943,6 +1370,7 @@ if is_live_mode:
     matcher_html = ""
     if appearance_match:
         matcher_html = f'<span class="status-pill matcher">Matcher: {matcher_mode}</span>'
+    latency_html = latency_hud_html(live_timer) if latency_hud else ""
 
     st.markdown(
         f"""
@@ -950,6 +1378,7 @@ if is_live_mode:
             {track_status_html}
             <span class="status-pill frame">📷 Live</span>
             {matcher_html}
+            {latency_html}
         </div>
         """,
         unsafe_allow_html=True,
@@ -959,8 +1388,13 @@ if is_live_mode:
     st.markdown('<div class="preview-wrapper">', unsafe_allow_html=True)
     coords = streamlit_image_coordinates(pil_img, key="live-click")
     st.markdown('</div>', unsafe_allow_html=True)
+    live_timer.add("transfer", time.perf_counter() - transfer_started)
+    if metrics_exporter is not None:
+        metrics_exporter.export(metrics_source("live"), live_timer)
 
     st.markdown('<div class="click-hint">Click on a detected subject to track it · Click elsewhere to switch target</div>', unsafe_allow_html=True)
+    if live_enhancer is not None:
+        st.caption(lowlight_timing_caption(live_enhancer))
 
     # ── Click handling (same as video mode) ──
     if coords and st.session_state.lock_target:
@@ -977,15 +1411,16 @@ if is_live_mode:
 
     if st.session_state.live_pending_click is not None:
         click = st.session_state.live_pending_click
-        selection = choose_target_from_click(result, click["x"], click["y"])
+        selection = choose_target_from_click(detections, click["x"], click["y"])
         if selection is None:
             st.warning("No detection under the click. Please click directly on the object.")
         else:
             st.session_state.live_selected_track_id = selection.track_id
             st.session_state.live_target_bbox = selection.bbox
+            reset_flow_tracker("live_flow")
             # Compute appearance embedding for matching
             if appearance_match and matcher is not None:
-                embedding = matcher.embed_crop(tracking_frame, selection.bbox)
+                embedding = matcher.embed_crop(tracking_frame, selection.bbox, cache=frame_embeddings)
                 if embedding is not None:
                     st.session_state.target_embedding = embedding
                 else:
@@ -996,8 +1431,9 @@ if is_live_mode:
         st.session_state.live_pending_click = None
 
     # ── Continuous rerun for live feed ──
+    # No fixed sleep: the next camera.read() blocks until a fresh frame, so the loop runs at
+    # min(camera rate, processing rate).
     if st.session_state.live_playing:
-        time.sleep(1.0 / 10)  # ~10 FPS refresh
         st.rerun()
 
     st.stop()
@@ -1041,6 +1477,7 @@ if start_clicked:
     st.session_state.lock_target = False
     st.session_state.target_embedding = None
     ensure_preview_model(reset=True)
+    reset_flow_tracker("preview_flow")
     st.rerun()
 
 if play_pause:
@@ -1064,6 +1501,7 @@ if reset_clicked:
     st.session_state.target_embedding = None
     if "preview_model" in st.session_state:
         del st.session_state.preview_model
+    reset_flow_tracker("preview_flow")
     st.rerun()
 
 if not st.session_state.preview_started:
@@ -1112,38 +1550,66 @@ if st.session_state.last_frame_index is not None:
     if current_frame != expected_next:
         reset_tracker = True
 
+# A sidecar recorded by Process & Save stands in for YOLO + ByteTrack on the frames it covers.
+detection_options = FocusOptions(low_light=low_light, fast_enhance=fast_enhance, luma_gate=luma_gate)
+preview_sidecar = ensure_preview_sidecar(video_key, detection_options, current_frame) if reuse_detections else None
+detection_source = str(preview_sidecar.path) if preview_sidecar is not None else "model"
+previous_source = st.session_state.get("detection_source")
+if detection_source == "model" and previous_source not in (None, "model"):
+    reset_tracker = True
+
 model_preview = ensure_preview_model(reset=reset_tracker)
+if reset_tracker:
+    reset_flow_tracker("preview_flow")
+preview_timer = ensure_stage_timer("preview_timer")
 
-cap, _ = open_video(video_path)
-ok, frame = read_frame_at(cap, current_frame)
-cap.release()
+with preview_timer.stage("decode"):
+    ok, frame = frame_reader.read(current_frame)
 
 if not ok:
     st.session_state.playing = False
     st.warning("Reached the end of the video.")
     st.stop()
 
-tracking_frame = enhance_low_light(frame) if low_light else frame
+preview_enhancer = ensure_enhancer("preview_enhancer", fast_enhance, luma_gate) if low_light else None
+with preview_timer.stage("lowlight"):
+    tracking_frame = preview_enhancer(frame) if preview_enhancer is not None else frame
 
-results_preview = model_preview.track(
-    tracking_frame,
-    persist=True,
-    tracker="bytetrack.yaml",
-    verbose=False,
-)
-result_preview = results_preview[0]
+with preview_timer.stage("detect"):
+    if preview_sidecar is not None:
+        detections_preview = preview_sidecar.get(current_frame)
+    else:
+        results_preview = model_preview.track(
+            tracking_frame,
+            persist=True,
+            tracker="bytetrack.yaml",
+            verbose=False,
+        )
+        detections_preview = Detections.from_result(results_preview[0])
+
+if previous_source != detection_source:
+    # The sidecar's tracker and the live one number IDs independently; carry the selection over by overlap.
+    if st.session_state.selected_track_id is not None and st.session_state.last_bbox is not None:
+        _, remapped_id = find_bbox_and_id_by_overlap(detections_preview, st.session_state.last_bbox)
+        if remapped_id is not None:
+            st.session_state.selected_track_id = remapped_id
+    st.session_state.detection_source = detection_source
+match_started = time.perf_counter()
 
 selected_track_id = st.session_state.selected_track_id
+frame_embeddings = EmbeddingCache(frame_id=current_frame)
 
 bbox = None
 if selected_track_id is not None:
-    bbox = find_bbox_for_track(result_preview, selected_track_id)
+    bbox = find_bbox_for_track(detections_preview, selected_track_id)
     if bbox is None and fast_motion and st.session_state.last_bbox is not None:
-        last_bbox = st.session_state.last_bbox
-        bbox_w = max(1, last_bbox[2] - last_bbox[0])
-        bbox_h = max(1, last_bbox[3] - last_bbox[1])
-        max_distance = max(bbox_w, bbox_h) * fast_motion_tolerance
-        bbox, new_id = find_bbox_and_id_by_proximity(result_preview, last_bbox, max_distance)
+        bbox, new_id = fast_motion_fallback(
+            detections_preview,
+            tracking_frame,
+            st.session_state.last_bbox,
+            ensure_flow_tracker("preview_flow"),
+            fast_motion_tolerance,
+        )
         if new_id is not None:
             st.session_state.selected_track_id = new_id
             selected_track_id = new_id
@@ -1151,34 +1617,56 @@ if selected_track_id is not None:
 target_embedding = st.session_state.target_embedding
 if appearance_match and matcher is not None and target_embedding is not None:
     if bbox is not None:
-        current_emb = matcher.embed_crop(tracking_frame, bbox)
+        current_emb = matcher.embed_crop(tracking_frame, bbox, cache=frame_embeddings)
         sim = matcher.cosine_similarity(current_emb, target_embedding) if current_emb is not None else -1.0
         if sim < keep_threshold:
-            candidates = get_candidate_boxes(result_preview, max_candidates=5)
-            best_bbox, best_id, best_sim = matcher.best_match(tracking_frame, candidates, target_embedding)
+            candidates = get_candidate_boxes(detections_preview, max_candidates=5)
+            best_bbox, best_id, best_sim = matcher.best_match(
+                tracking_frame, candidates, target_embedding, cache=frame_embeddings
+            )
             if best_bbox is not None and best_sim >= switch_threshold:
                 bbox = best_bbox
                 st.session_state.selected_track_id = best_id
                 selected_track_id = best_id
     else:
-        candidates = get_candidate_boxes(result_preview, max_candidates=5)
-        best_bbox, best_id, best_sim = matcher.best_match(tracking_frame, candidates, target_embedding)
+        candidates = get_candidate_boxes(detections_preview, max_candidates=5)
+        best_bbox, best_id, best_sim = matcher.best_match(
+            tracking_frame, candidates, target_embedding, cache=frame_embeddings
+        )
         if best_bbox is not None and best_sim >= switch_threshold:
             bbox = best_bbox
             st.session_state.selected_track_id = best_id
             selected_track_id = best_id
+preview_timer.add("match", time.perf_counter() - match_started)
 
+compositor, compose_out = ensure_compositor("preview_compositor", tracking_frame)
 preview_frame = tracking_frame
 if selected_track_id is not None:
-    preview_frame = apply_focus_effect(tracking_frame, bbox, use_grabcut=adaptive_blur)
+    roi_mask = None
+    if adaptive_blur and bbox is not None:
+        with preview_timer.stage("segment"):
+            roi_mask = ensure_segmenter("preview_segmenter").segment(tracking_frame, bbox, selected_track_id)
+    with preview_timer.stage("effect"):
+        preview_frame = compositor.compose(
+            tracking_frame,
+            bbox,
+            compose_out,
+            roi_mask=roi_mask,
+            blur_ksize=blur_ksize,
+            blur_downscale=blur_downscale,
+        )
     st.session_state.last_bbox = bbox
+    if fast_motion and bbox is not None:
+        ensure_flow_tracker("preview_flow").observe(tracking_frame, bbox)
 else:
     st.session_state.last_bbox = None
 
 if show_boxes:
-    preview_frame = draw_boxes(preview_frame, result_preview)
+    with preview_timer.stage("draw"):
+        preview_frame = draw_boxes(preview_frame, detections_preview, inplace=preview_frame is compose_out)
 
-rgb = cv2.cvtColor(preview_frame, cv2.COLOR_BGR2RGB)
+transfer_started = time.perf_counter()
+rgb = compositor.to_rgb(preview_frame)
 pil_img = Image.fromarray(rgb)
 
 # ── Status Bar ──
@@ -1197,6 +1685,7 @@ play_icon = "▶" if st.session_state.playing else "⏸"
 matcher_html = ""
 if appearance_match:
     matcher_html = f'<span class="status-pill matcher">Matcher: {matcher_mode}</span>'
+latency_html = latency_hud_html(preview_timer) if latency_hud else ""
 
 st.markdown(
     f"""
@@ -1205,6 +1694,7 @@ st.markdown(
         {frame_html}
         <span class="status-pill" style="background:rgba(139,148,158,0.05); border-color:var(--border); color:var(--text-muted);">{play_icon} {play_state}</span>
         {matcher_html}
+        {latency_html}
     </div>
     """,
     unsafe_allow_html=True,
@@ -1214,8 +1704,13 @@ st.markdown(
 st.markdown('<div class="preview-wrapper">', unsafe_allow_html=True)
 coords = streamlit_image_coordinates(pil_img, key="preview-click")
 st.markdown('</div>', unsafe_allow_html=True)
+preview_timer.add("transfer", time.perf_counter() - transfer_started)
+if metrics_exporter is not None:
+    metrics_exporter.export(metrics_source("preview"), preview_timer)
 
 st.markdown('<div class="click-hint">Click on a detected subject to track it · Click elsewhere to switch target</div>', unsafe_allow_html=True)
+if preview_enhancer is not None:
+    st.caption(lowlight_timing_caption(preview_enhancer))
 
 # ── Click handling (logic unchanged) ──
 if coords and st.session_state.lock_target:
@@ -1235,7 +1730,7 @@ if coords and st.session_state.pending_click is None and not st.session_state.lo
 
 if st.session_state.pending_click is not None:
     click = st.session_state.pending_click
-    selection = choose_target_from_click(result_preview, click["x"], click["y"])
+    selection = choose_target_from_click(detections_preview, click["x"], click["y"])
     if selection is None:
         st.warning("No detection under the click. Please click directly on the object.")
     else:
@@ -1243,8 +1738,9 @@ if st.session_state.pending_click is not None:
         st.session_state.selected_point = (click["x"], click["y"])
         st.session_state.selection_frame = current_frame
         st.session_state.last_bbox = selection.bbox
+        reset_flow_tracker("preview_flow")
         if appearance_match and matcher is not None:
-            embedding = matcher.embed_crop(tracking_frame, selection.bbox)
+            embedding = matcher.embed_crop(tracking_frame, selection.bbox, cache=frame_embeddings)
             if embedding is None:
                 st.warning("Could not compute appearance embedding for this selection.")
             else:
@@ -1265,6 +1761,7 @@ if st.session_state.playing:
     else:
         next_frame = current_frame + frame_step
         st.session_state.current_frame = min(next_frame, meta.frame_count - 1)
+        frame_reader.prefetch(st.session_state.current_frame, count=PREFETCH_FRAMES, step=frame_step)
         time.sleep(1.0 / max(1, preview_fps))
         st.rerun()
 
@@ -1287,93 +1784,76 @@ if save_output:
 
         progress = st.progress(0.0, text="Processing…")
 
-        model = load_model("yolov8n.pt")
-        cap_process, _ = open_video(video_path)
-
-        ok_first, frame_first = read_frame_at(cap_process, selection_frame)
-        if not ok_first:
-            cap_process.release()
-            st.error("Could not read the selected frame for processing.")
-            st.stop()
-
-        tracking_first = enhance_low_light(frame_first) if low_light else frame_first
-        first_results = model.track(
-            tracking_first,
-            persist=True,
-            tracker="bytetrack.yaml",
-            verbose=False,
+        options = FocusOptions(
+            low_light=low_light,
+            fast_enhance=fast_enhance,
+            luma_gate=luma_gate,
+            grabcut=adaptive_blur,
+            fast_motion=fast_motion,
+            fast_motion_tolerance=fast_motion_tolerance,
+            appearance_match=appearance_match,
+            appearance_strictness=appearance_strictness,
+            blur_ksize=blur_ksize,
+            blur_downscale=blur_downscale,
+            detect_batch=detect_batch,
+            detect_stride=detect_stride,
+            roi_detect=roi_detect,
+            roi_full_every=roi_full_every,
         )
-        first_result = first_results[0]
-
-        selection = choose_target_from_click(first_result, click_x, click_y)
-        if selection is None:
-            cap_process.release()
-            st.error("No detection under the click. Please click directly on the object.")
-            st.stop()
-
         output_path = Path(tempfile.mkstemp(suffix=".mp4")[1])
-        writer = make_video_writer(str(output_path), meta)
-
-        processed = apply_focus_effect(tracking_first, selection.bbox, use_grabcut=adaptive_blur)
-        writer.write(processed)
-
-        processed_frames = 1
-        total_frames = max(1, meta.frame_count - selection_frame)
-        current_track_id = selection.track_id
-        last_bbox = selection.bbox
-        target_embedding = None
-        if appearance_match and matcher is not None:
-            target_embedding = matcher.embed_crop(tracking_first, selection.bbox)
 
-        for _, frame in iter_frames(cap_process, start=selection_frame + 1):
-            tracking_frame = enhance_low_light(frame) if low_light else frame
-            results = model.track(
-                tracking_frame,
-                persist=True,
-                tracker="bytetrack.yaml",
-                verbose=False,
-            )
-            result = results[0]
-            bbox = find_bbox_for_track(result, current_track_id)
-            if bbox is None and fast_motion and last_bbox is not None:
-                bbox_w = max(1, last_bbox[2] - last_bbox[0])
-                bbox_h = max(1, last_bbox[3] - last_bbox[1])
-                max_distance = max(bbox_w, bbox_h) * fast_motion_tolerance
-                bbox, new_id = find_bbox_and_id_by_proximity(result, last_bbox, max_distance)
-                if new_id is not None:
-                    current_track_id = new_id
-            if appearance_match and matcher is not None and target_embedding is not None:
-                if bbox is not None:
-                    current_emb = matcher.embed_crop(tracking_frame, bbox)
-                    sim = matcher.cosine_similarity(current_emb, target_embedding) if current_emb is not None else -1.0
-                    if sim < keep_threshold:
-                        candidates = get_candidate_boxes(result, max_candidates=5)
-                        best_bbox, best_id, best_sim = matcher.best_match(
-                            tracking_frame, candidates, target_embedding
-                        )
-                        if best_bbox is not None and best_sim >= switch_threshold:
-                            bbox = best_bbox
-                            current_track_id = best_id
-                else:
-                    candidates = get_candidate_boxes(result, max_candidates=5)
-                    best_bbox, best_id, best_sim = matcher.best_match(
-                        tracking_frame, candidates, target_embedding
-                    )
-                    if best_bbox is not None and best_sim >= switch_threshold:
-                        bbox = best_bbox
-                        current_track_id = best_id
-            if bbox is not None:
-                last_bbox = bbox
-            processed = apply_focus_effect(tracking_frame, bbox, use_grabcut=adaptive_blur)
-            writer.write(processed)
-
-            processed_frames += 1
+        def report_progress(processed_frames, total_frames):
             progress.progress(min(1.0, processed_frames / total_frames), text="Processing…")
 
-        cap_process.release()
-        writer.release()
+        export_timer = StageTimer()
+        try:
+            if parallel_segments > 1 and appearance_match:
+                with get_model_pool().borrow() as export_model:
+                    process_result = process_video_segmented(
+                        video_path,
+                        str(output_path),
+                        selection_frame,
+                        click=(click_x, click_y),
+                        options=options,
+                        model=export_model,
+                        matcher=matcher,
+                        workers=parallel_segments,
+                        on_progress=report_progress,
+                    )
+                export_timer.merge(process_result.timings)
+            else:
+                detections_path = None
+                if reuse_detections:
+                    detections_path = str(sidecar_path(video_key, options, selection_frame))
+                with get_model_pool().borrow() as export_model:
+                    process_result = process_video(
+                        video_path,
+                        str(output_path),
+                        selection_frame,
+                        click=(click_x, click_y),
+                        options=options,
+                        model=export_model,
+                        matcher=matcher,
+                        frame_reader=frame_reader,
+                        on_progress=report_progress,
+                        timer=export_timer,
+                        detections_path=detections_path,
+                    )
+                if detections_path is not None:
+                    evict_uploads(UPLOAD_CACHE_DIR, UPLOAD_CACHE_BYTES, keep=Path(video_path))
+        except ValueError as exc:
+            st.error(str(exc))
+            st.stop()
 
         progress.progress(1.0, text="Done!")
+        if metrics_exporter is not None:
+            metrics_exporter.export(metrics_source("export"), export_timer, force=True)
+        st.caption(
+            f"{process_result.frames} frames at {process_result.fps:.1f} frames/s · "
+            + stage_timing_caption(process_result.timings)
+        )
+        if process_result.drift:
+            st.caption(drift_caption(process_result.drift))
 
         with open(output_path, "rb") as f:
             st.download_button(
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import RESOLUTIONS, ensure_clip, synthetic_boxes
+from utils.focus import FocusOptions
+from utils.timing import StageTimer
+from utils.tracking import AppearanceMatcher, apply_focus_effect, enhance_low_light, load_model
+from utils.video import iter_frames, make_video_writer, open_video
+
+STAGES = (
+    "decode",
+    "enhance_low_light",
+    "model.track",
+    "embed_crop.hist",
+    "embed_crop.torch",
+    "apply_focus_effect",
+    "apply_focus_effect.grabcut",
+    "encode",
+)
+
+
+class StageSkipped(Exception):
+    pass
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).resolve().parent,
+        )
+    except OSError:
+        return None
+    return completed.stdout.strip() or None
+
+
+def _time_frames(
+    clip: Path,
+    boxes: List[List[tuple]],
+    op: Callable[[np.ndarray, tuple], None],
+    timer: StageTimer,
+    name: str,
+    warmup: int,
+) -> None:
+    cap, _ = open_video(str(clip))
+    try:
+        for index, frame in iter_frames(cap):
+            target = boxes[index][0]
+            if index < warmup:
+                op(frame, target)
+                continue
+            with timer.stage(name):
+                op(frame, target)
+    finally:
+        cap.release()
+
+
+def _stage_op(name: str, model_name: str) -> Callable[[np.ndarray, tuple], None]:
+    if name == "enhance_low_light":
+        return lambda frame, bbox: enhance_low_light(frame)
+    if name == "model.track":
+        try:
+            model = load_model(model_name)
+        except Exception as exc:
+            raise StageSkipped(f"model unavailable: {exc}")
+        # Same tracker config as the app; without it ultralytics falls back to BoT-SORT.
+        tracker = FocusOptions().tracker
+        return lambda frame, bbox: model.track(frame, persist=True, conf=0.1, tracker=tracker, verbose=False)
+    if name.startswith("embed_crop."):
+        mode = name.split(".", 1)[1]
+        matcher = AppearanceMatcher(use_pretrained=mode == "torch")
+        if matcher.mode != mode:
+            raise StageSkipped(f"AppearanceMatcher fell back to {matcher.mode} mode")
+        return lambda frame, bbox: matcher.embed_crop(frame, bbox)
+    if name == "apply_focus_effect":
+        return lambda frame, bbox: apply_focus_effect(frame, bbox, use_grabcut=False)
+    if name == "apply_focus_effect.grabcut":
+        return lambda frame, bbox: apply_focus_effect(frame, bbox, use_grabcut=True)
+    raise ValueError(f"Unknown stage {name!r}")
+
+
+def run_resolution(
+    resolution: str,
+    stages: List[str],
+    frames: int,
+    seed: int,
+    warmup: int,
+    cache_dir: str,
+    model_name: str,
+) -> Dict[str, Dict]:
+    clip = ensure_clip(cache_dir, resolution, frames, seed=seed)
+    width, height = RESOLUTIONS[resolution]
+    boxes = synthetic_boxes(width, height, frames, seed=seed)
+    timer = StageTimer()
+    skipped: Dict[str, str] = {}
+
+    for name in stages:
+        if name == "decode":
+            cap, meta = open_video(str(clip))
+            try:
+                for _ in range(meta.frame_count):
+                    with timer.stage(name):
+                        ok, _ = cap.read()
+                    if not ok:
+                        break
+            finally:
+                cap.release()
+        elif name == "encode":
+            # Decode and write one frame at a time so 4k clips are never held in memory; only the write is timed.
+            cap, meta = open_video(str(clip))
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                writer = make_video_writer(os.path.join(tmp_dir, "encode.mp4"), meta)
+                try:
+                    for _, frame in iter_frames(cap):
+                        with timer.stage(name):
+                            writer.write(frame)
+                finally:
+                    writer.release()
+                    cap.release()
+        else:
+            try:
+                op = _stage_op(name, model_name)
+            except StageSkipped as exc:
+                skipped[name] = str(exc)
+                continue
+            _time_frames(clip, boxes, op, timer, name, warmup)
+
+    results: Dict[str, Dict] = {}
+    for name, stats in timer.summary().items():
+        results[name] = {
+            "frames": int(stats["count"]),
+            "ms_per_frame": stats["ms_per_call"],
+            "fps": stats["calls_per_s"],
+            "p50_ms": stats["p50_ms"],
+            "p95_ms": stats["p95_ms"],
+        }
+    for name, reason in skipped.items():
+        results[name] = {"skipped": reason}
+    return results
+
+
+def compare(current: Dict, baseline: Dict) -> List[str]:
+    lines = []
+    for resolution, stages in current["results"].items():
+        for name, stats in stages.items():
+            before = baseline.get("results", {}).get(resolution, {}).get(name, {})
+            if "ms_per_frame" not in stats or "ms_per_frame" not in before:
+                continue
+            ratio = stats["ms_per_frame"] / before["ms_per_frame"] if before["ms_per_frame"] else float("inf")
+            lines.append(
+                f"{resolution:<6} {name:<28} {before['ms_per_frame']:>9.2f} -> {stats['ms_per_frame']:>9.2f} ms/frame  x{ratio:.2f}"
+            )
+    return lines
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Time each processing stage on synthetic clips.")
+    parser.add_argument("--resolutions", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--frames", type=int, default=60, help="Frames per synthetic clip.")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed frames at the start of each stage.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument(
+        "--cache-dir",
+        default=os.path.join(tempfile.gettempdir(), "bullseye_bench"),
+        help="Where generated clips are kept between runs.",
+    )
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    parser.add_argument("--compare", help="Earlier JSON report to print per-stage ratios against.")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "frames": args.frames,
+            "warmup": args.warmup,
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+    for resolution in args.resolutions:
+        report["results"][resolution] = run_resolution(
+            resolution,
+            args.stages,
+            args.frames,
+            args.seed,
+            args.warmup,
+            args.cache_dir,
+            args.model,
+        )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print("\n".join(compare(report, baseline)), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.video import VideoMeta, make_video_writer
+
+RESOLUTIONS = {
+    "480p": (854, 480),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+
+@dataclass
+class _Sprite:
+    x: float
+    y: float
+    w: int
+    h: int
+    vx: float
+    vy: float
+    color: Tuple[int, int, int]
+    texture: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def step(self, width: int, height: int) -> None:
+        self.x += self.vx
+        self.y += self.vy
+        if not 0 <= self.x <= width - self.w:
+            self.vx = -self.vx
+            self.x = float(np.clip(self.x, 0, width - self.w))
+        if not 0 <= self.y <= height - self.h:
+            self.vy = -self.vy
+            self.y = float(np.clip(self.y, 0, height - self.h))
+
+    @property
+    def bbox(self) -> Tuple[int, int, int, int]:
+        return int(self.x), int(self.y), int(self.x) + self.w, int(self.y) + self.h
+
+
+def _background(rng: np.random.Generator, width: int, height: int) -> np.ndarray:
+    # Low-frequency noise over a grass-like base, so blur and the codec have real texture to work on.
+    noise = rng.integers(0, 256, (max(2, height // 32), max(2, width // 32), 3), dtype=np.uint8)
+    noise = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+    base = np.empty((height, width, 3), np.uint8)
+    base[:] = (40, 110, 50)
+    return cv2.addWeighted(base, 0.75, noise, 0.25, 0)
+
+
+def _sprites(rng: np.random.Generator, width: int, height: int, rects: int, blobs: int) -> List[_Sprite]:
+    scale = height / 480.0
+    sprites = []
+    for index in range(rects + blobs):
+        w = int(rng.uniform(30, 70) * scale)
+        h = int(rng.uniform(60, 140) * scale)
+        sprite = _Sprite(
+            x=float(rng.uniform(0, width - w)),
+            y=float(rng.uniform(0, height - h)),
+            w=w,
+            h=h,
+            vx=float(rng.uniform(-6, 6) * scale),
+            vy=float(rng.uniform(-3, 3) * scale),
+            color=tuple(int(c) for c in rng.integers(0, 256, 3)),
+        )
+        if index >= rects:
+            texture = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+            mask = np.zeros((h, w), np.uint8)
+            cv2.ellipse(mask, (w // 2, h // 2), (w // 2, h // 2), 0, 0, 360, 255, -1)
+            sprite.texture = (texture, mask.astype(bool))
+        sprites.append(sprite)
+    return sprites
+
+
+def _simulate(
+    width: int,
+    height: int,
+    frames: int,
+    seed: int,
+    rects: int,
+    blobs: int,
+    draw: bool,
+) -> Iterator[Tuple[Optional[np.ndarray], List[Tuple[int, int, int, int]]]]:
+    rng = np.random.default_rng(seed)
+    background = _background(rng, width, height)
+    sprites = _sprites(rng, width, height, rects, blobs)
+    for _ in range(frames):
+        if not draw:
+            yield None, [sprite.bbox for sprite in sprites]
+            for sprite in sprites:
+                sprite.step(width, height)
+            continue
+
+        frame = background.copy()
+        for sprite in sprites:
+            x1, y1, x2, y2 = sprite.bbox
+            if sprite.texture is None:
+                cv2.rectangle(frame, (x1, y1), (x2 - 1, y2 - 1), sprite.color, -1)
+            else:
+                texture, mask = sprite.texture
+                frame[y1:y2, x1:x2][mask] = texture[mask]
+        yield frame, [sprite.bbox for sprite in sprites]
+        for sprite in sprites:
+            sprite.step(width, height)
+
+
+def synthetic_frames(
+    width: int,
+    height: int,
+    frames: int,
+    seed: int = 0,
+    rects: int = 3,
+    blobs: int = 2,
+) -> Iterator[Tuple[np.ndarray, List[Tuple[int, int, int, int]]]]:
+    # Moving coloured rectangles and textured blobs; the same seed gives the same clip.
+    return _simulate(width, height, frames, seed, rects, blobs, draw=True)
+
+
+def synthetic_boxes(
+    width: int,
+    height: int,
+    frames: int,
+    seed: int = 0,
+    rects: int = 3,
+    blobs: int = 2,
+) -> List[List[Tuple[int, int, int, int]]]:
+    # Ground-truth boxes of synthetic_frames() for the same arguments, without drawing anything.
+    return [boxes for _, boxes in _simulate(width, height, frames, seed, rects, blobs, draw=False)]
+
+
+def write_clip(path: str, resolution: str, frames: int, fps: float = 30.0, seed: int = 0) -> VideoMeta:
+    width, height = RESOLUTIONS[resolution]
+    meta = VideoMeta(width=width, height=height, fps=fps, frame_count=frames)
+    writer = make_video_writer(str(path), meta)
+    try:
+        for frame, _ in synthetic_frames(width, height, frames, seed=seed):
+            writer.write(frame)
+    finally:
+        writer.release()
+    return meta
+
+
+def ensure_clip(cache_dir: str, resolution: str, frames: int, seed: int = 0) -> Path:
+    path = Path(cache_dir) / f"synthetic_{resolution}_{frames}f_seed{seed}.mp4"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Keep the .mp4 suffix so OpenCV picks the container; swap in only once fully written.
+        tmp_path = path.with_name(f"{path.stem}.part.mp4")
+        write_clip(str(tmp_path), resolution, frames, seed=seed)
+        os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+
+from benchmarks import run
+from benchmarks.synthetic import RESOLUTIONS, synthetic_boxes, synthetic_frames
+
+
+@pytest.fixture
+def tiny(monkeypatch):
+    monkeypatch.setitem(RESOLUTIONS, "tiny", (96, 64))
+    return "tiny"
+
+
+def test_synthetic_boxes_match_the_drawn_clip():
+    drawn = list(synthetic_frames(96, 64, 5, seed=3))
+    assert [boxes for _, boxes in drawn] == synthetic_boxes(96, 64, 5, seed=3)
+    assert all(frame.shape == (64, 96, 3) for frame, _ in drawn)
+    np.testing.assert_array_equal(drawn[0][0], next(synthetic_frames(96, 64, 5, seed=3))[0])
+
+
+def test_report_has_every_requested_stage(tiny, tmp_path):
+    output = tmp_path / "report.json"
+    stages = ["decode", "encode", "enhance_low_light", "apply_focus_effect"]
+    argv = ["--resolutions", tiny, "--stages", *stages, "--frames", "6", "--warmup", "1"]
+    assert run.main(argv + ["--cache-dir", str(tmp_path), "--output", str(output)]) == 0
+
+    report = json.loads(output.read_text())
+    assert {"commit", "timestamp", "python", "opencv", "numpy", "frames", "warmup", "seed"} <= set(report["meta"])
+    assert set(report["results"]) == {tiny}
+    results = report["results"][tiny]
+    assert set(results) == set(stages)
+    for stats in results.values():
+        assert set(stats) == {"frames", "ms_per_frame", "fps", "p50_ms", "p95_ms"}
+    assert results["decode"]["frames"] == results["encode"]["frames"] == 6
+    assert results["enhance_low_light"]["frames"] == 5
+
+    lines = run.compare(report, report)
+    assert len(lines) == len(stages) and all(line.endswith("x1.00") for line in lines)
@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+
+from utils import focus
+from utils.focus import FocusOptions, TargetTracker, render_frames
+from utils.timing import StageTimer
+from utils.tracking import Detections, FocusCompositor
+from utils.video import VideoMeta
+
+
+class EffectFailed(Exception):
+    pass
+
+
+class _FailingCompositor(FocusCompositor):
+    def compose(self, *args, **kwargs):
+        raise EffectFailed("effect stage broke")
+
+
+class _NullWriter:
+    def write(self, frame):
+        pass
+
+
+def test_render_frames_raises_when_effect_stage_fails(monkeypatch):
+    meta = VideoMeta(width=32, height=32, fps=30.0, frame_count=200)
+    frames = [(index, np.zeros((32, 32, 3), np.uint8)) for index in range(meta.frame_count)]
+    monkeypatch.setattr(focus, "iter_frames", lambda cap, start=0, stop=None: iter(frames[start:stop]))
+    monkeypatch.setattr(focus, "FocusCompositor", _FailingCompositor)
+
+    raised = []
+
+    def run():
+        try:
+            render_frames(
+                None,
+                meta,
+                _NullWriter(),
+                TargetTracker(),
+                lambda batch: [Detections.empty() for _ in batch],
+                FocusOptions(appearance_match=False),
+                StageTimer(),
+                start=0,
+            )
+        except BaseException as exc:
+            raised.append(exc)
+
+    # Without a stop-aware acquire the infer stage waits forever on buffers the failed effects never return.
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    worker.join(timeout=10)
+    assert not worker.is_alive(), "render_frames hung after the effect stage failed"
+    assert len(raised) == 1 and isinstance(raised[0], EffectFailed)
@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+
+from utils.jobs import JobQueue, JobSpec
+
+
+def test_jobs_are_claimed_in_submission_order(tmp_path):
+    queue = JobQueue(str(tmp_path))
+    submitted = [queue.submit(JobSpec(f"in{index}.mp4", f"out{index}.mp4")) for index in range(50)]
+
+    claimed = []
+    while (job := queue.claim()) is not None:
+        claimed.append(job[0])
+    assert claimed == submitted
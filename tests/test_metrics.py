@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from utils.metrics import format_prometheus
+from utils.timing import StageTimer
+
+
+def test_stage_latency_is_a_prometheus_summary():
+    timer = StageTimer()
+    timer.add("detect", 0.010)
+    timer.add("detect", 0.030)
+    text = format_prometheus({"cli": timer.summary()})
+
+    assert "# TYPE bullseye_stage_latency_ms summary" in text
+    assert 'bullseye_stage_latency_ms{source="cli",stage="detect",quantile="0.95"}' in text
+    assert 'bullseye_stage_latency_ms_sum{source="cli",stage="detect"} 40.0000' in text
+    assert 'bullseye_stage_latency_ms_count{source="cli",stage="detect"} 2' in text
+
+
+def test_prometheus_keeps_every_source_and_drops_stale_ones(tmp_path, monkeypatch):
+    from utils import metrics
+
+    clock = [1000.0]
+    monkeypatch.setattr(metrics.time, "time", lambda: clock[0])
+    exporter = metrics.MetricsExporter(str(tmp_path / "bullseye.prom"), fmt="prometheus", stale_s=60.0)
+    timer = StageTimer()
+    timer.add("detect", 0.010)
+
+    exporter.export("preview-a", timer)
+    exporter.export("preview-b", timer)
+    text = exporter.path.read_text()
+    assert 'source="preview-a"' in text and 'source="preview-b"' in text
+
+    clock[0] += 90.0
+    exporter.export("preview-b", timer)
+    text = exporter.path.read_text()
+    assert 'source="preview-a"' not in text and 'source="preview-b"' in text
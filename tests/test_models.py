@@ -0,0 +1,35 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("ultralytics")
+
+from utils.models import ModelPool
+from utils.tracking import BatchTracker, _is_track_callback
+
+
+def _track_callbacks(model):
+    return [cb for event in ("on_predict_start", "on_predict_postprocess_end") for cb in model.callbacks[event]]
+
+
+def test_released_model_is_untracked_for_batch_tracker():
+    # yolov8n.yaml builds untrained weights locally, so the test needs no download.
+    pool = ModelPool("yolov8n.yaml", max_idle=1, warmup_size=64)
+    frame = np.zeros((64, 64, 3), np.uint8)
+
+    with pool.borrow() as model:
+        model.track(frame, persist=True, tracker="bytetrack.yaml", verbose=False)
+        assert any(_is_track_callback(cb) for cb in _track_callbacks(model))
+        assert hasattr(model.predictor, "trackers")
+
+    with pool.borrow() as reused:
+        assert reused is model
+        assert not any(_is_track_callback(cb) for cb in _track_callbacks(reused))
+        assert not hasattr(reused.predictor, "trackers")
+
+        BatchTracker(reused).track([frame, frame])
+        # A leftover on_predict_start callback would have rebuilt predictor.trackers during predict().
+        assert not hasattr(reused.predictor, "trackers")
+
+    with pool.borrow() as again:
+        again.track(frame, persist=True, tracker="bytetrack.yaml", verbose=False)
+        assert hasattr(again.predictor, "trackers")
@@ -0,0 +1,129 @@
+from concurrent.futures import Future
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+
+from utils import segments
+from utils.focus import FocusOptions
+from utils.focus_cli import main as cli_main
+from utils.timing import StageTimer
+from utils.tracking import Detections
+from utils.video import VideoMeta
+
+
+class _FakeCap:
+    def release(self):
+        pass
+
+
+class _FakeBatchTracker:
+    def __init__(self, model, tracker="bytetrack.yaml", conf=0.1):
+        pass
+
+    def track(self, frames):
+        box = Detections(
+            xyxy=np.array([[10, 10, 50, 50]], np.float32),
+            conf=np.array([0.9], np.float32),
+            ids=np.array([1], np.int64),
+            cls=np.array([0], np.int64),
+        )
+        return [box for _ in frames]
+
+
+@pytest.fixture
+def run_segment_calls(monkeypatch):
+    calls = []
+    meta = VideoMeta(width=64, height=64, fps=30.0, frame_count=600)
+    monkeypatch.setattr(segments, "open_video", lambda path: (_FakeCap(), meta))
+    monkeypatch.setattr(segments, "read_frame_at", lambda cap, index: (True, np.zeros((64, 64, 3), np.uint8)))
+    monkeypatch.setattr(segments, "load_model", lambda name: object())
+    monkeypatch.setattr(segments, "BatchTracker", _FakeBatchTracker)
+    monkeypatch.setattr(segments, "run_segment", lambda job: calls.append(job))
+    return calls
+
+
+def test_segments_without_appearance_are_rejected_before_running(run_segment_calls, tmp_path):
+    with pytest.raises(ValueError, match="appearance"):
+        segments.process_video_segmented(
+            "clip.mp4",
+            str(tmp_path / "out.mp4"),
+            0,
+            click=(30, 30),
+            options=FocusOptions(appearance_match=False),
+            workers=4,
+            segments=4,
+            work_dir=str(tmp_path),
+        )
+    assert run_segment_calls == []
+
+
+def test_cli_rejects_segments_without_appearance(capsys):
+    with pytest.raises(SystemExit):
+        cli_main(["in.mp4", "out.mp4", "--click", "1", "1", "--segments", "2", "--no-appearance"])
+    assert "--segments" in capsys.readouterr().err
+
+
+def test_cli_rejects_segments_with_detections_cache(capsys):
+    with pytest.raises(SystemExit):
+        cli_main(["in.mp4", "out.mp4", "--click", "1", "1", "--segments", "2", "--detections-cache"])
+    assert "--detections-cache" in capsys.readouterr().err
+
+
+
+def _result(index, entry, exit):
+    segment = segments.Segment(index=index, lead_in=index * 10, start=index * 10, stop=index * 10 + 10)
+    return segments.SegmentResult(segment, f"s{index}.mp4", 10, entry, exit, {})
+
+
+class _RecordingPool:
+    # Answers re-runs from a table instead of running them; as_completed() is patched to log each round.
+    def __init__(self, reruns):
+        self.reruns = reruns
+        self.anchors = {}
+
+    def submit(self, fn, job):
+        self.anchors[job.segment.index] = job.anchor_bbox
+        future = Future()
+        future.set_result(self.reruns[job.segment.index])
+        return future
+
+
+def _hand_off(monkeypatch, results, reruns):
+    rounds = []
+
+    def as_completed(futures):
+        rounds.append(sorted(futures.values()))
+        return list(futures)
+
+    monkeypatch.setattr(segments, "as_completed", as_completed)
+    jobs = [segments.SegmentJob("clip.mp4", r.output_path, r.segment, FocusOptions()) for r in results]
+    pool = _RecordingPool(reruns)
+    results = list(results)
+    segments._hand_off(pool, jobs, results, StageTimer())
+    return results, rounds, pool.anchors
+
+
+A, B, C, D = (0, 0, 10, 10), (50, 50, 60, 60), (100, 100, 110, 110), (150, 150, 160, 160)
+
+
+def test_independent_handoffs_rerun_together(monkeypatch):
+    results = [_result(0, A, A), _result(1, C, B), _result(2, B, B), _result(3, D, C)]
+    reruns = {1: _result(1, A, B), 3: _result(3, B, C)}
+    results, rounds, anchors = _hand_off(monkeypatch, results, reruns)
+
+    assert rounds == [[1, 3]]
+    assert anchors == {1: A, 3: B}
+    assert results[1] is reruns[1] and results[3] is reruns[3]
+
+
+def test_handoff_after_a_rerun_waits_for_the_new_exit(monkeypatch):
+    results = [_result(0, A, A), _result(1, C, C), _result(2, D, D), _result(3, D, D)]
+    # Re-running segment 1 moves its exit to B, which segment 2 then has to be seeded from; 3 follows 2.
+    reruns = {1: _result(1, A, B), 2: _result(2, B, C), 3: _result(3, C, C)}
+    results, rounds, anchors = _hand_off(monkeypatch, results, reruns)
+
+    assert rounds == [[1], [2], [3]]
+    assert anchors == {1: A, 2: B, 3: C}
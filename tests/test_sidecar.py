@@ -0,0 +1,28 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+
+from utils.sidecar import DetectionRecorder, DetectionSidecar
+from utils.tracking import Detections
+
+
+def test_truncated_sidecar_is_a_miss(tmp_path):
+    path = tmp_path / "clip.npz"
+    recorder = DetectionRecorder(start=0)
+    for index in range(3):
+        recorder.add(
+            index,
+            Detections(
+                xyxy=np.array([[1, 2, 30, 40]], np.float32),
+                conf=np.array([0.8], np.float32),
+                ids=np.array([5], np.int64),
+                cls=np.array([0], np.int64),
+            ),
+        )
+    recorder.save(path)
+    assert DetectionSidecar.open(path) is not None
+
+    path.write_bytes(path.read_bytes()[:64])
+    assert DetectionSidecar.open(path) is None
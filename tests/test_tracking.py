@@ -0,0 +1,250 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+
+from utils.tracking import (
+    Detections,
+    bbox_iou,
+    choose_target_from_click,
+    find_bbox_and_id_by_overlap,
+    find_bbox_and_id_by_proximity,
+    find_bbox_for_track,
+    get_candidate_boxes,
+    iou_matrix,
+)
+
+
+# Scalar implementations the vectorised queries replaced (find_bbox_and_id_by_overlap is the same loop over
+# the old bbox_iou), kept here as the reference.
+def _box(box):
+    x1, y1, x2, y2 = box
+    return int(x1), int(y1), int(x2), int(y2)
+
+
+def loop_bbox_iou(a, b):
+    ix1 = max(a[0], b[0])
+    iy1 = max(a[1], b[1])
+    ix2 = min(a[2], b[2])
+    iy2 = min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def loop_candidates(det, max_candidates=5):
+    if len(det.xyxy) == 0:
+        return []
+    indices = list(range(len(det.xyxy)))
+    if det.conf is not None:
+        indices.sort(key=lambda i: float(det.conf[i]), reverse=True)
+    if max_candidates is not None:
+        indices = indices[:max_candidates]
+    return [
+        (
+            _box(det.xyxy[i]),
+            int(det.ids[i]) if det.ids is not None else None,
+            float(det.conf[i]) if det.conf is not None else None,
+        )
+        for i in indices
+    ]
+
+
+def loop_click(det, click_x, click_y):
+    best_idx, best_dist = None, None
+    for i, (x1, y1, x2, y2) in enumerate(det.xyxy):
+        if click_x < x1 or click_x > x2 or click_y < y1 or click_y > y2:
+            continue
+        dist = (click_x - (x1 + x2) / 2.0) ** 2 + (click_y - (y1 + y2) / 2.0) ** 2
+        if best_dist is None or dist < best_dist:
+            best_dist, best_idx = dist, i
+    if best_idx is None or det.ids is None:
+        return None
+    return int(det.ids[best_idx]), _box(det.xyxy[best_idx])
+
+
+def loop_track(det, track_id):
+    if det.ids is None:
+        return None
+    for i, t_id in enumerate(det.ids):
+        if int(t_id) == int(track_id):
+            return _box(det.xyxy[i])
+    return None
+
+
+def loop_proximity(det, reference_bbox, max_distance=None):
+    if reference_bbox is None or len(det.xyxy) == 0:
+        return None, None
+    rx1, ry1, rx2, ry2 = reference_bbox
+    ref_cx, ref_cy = (rx1 + rx2) / 2.0, (ry1 + ry2) / 2.0
+    best_idx, best_dist = None, None
+    for i, (x1, y1, x2, y2) in enumerate(det.xyxy):
+        dist = ((ref_cx - (x1 + x2) / 2.0) ** 2 + (ref_cy - (y1 + y2) / 2.0) ** 2) ** 0.5
+        if max_distance is not None and dist > max_distance:
+            continue
+        if best_dist is None or dist < best_dist:
+            best_dist, best_idx = dist, i
+    if best_idx is None:
+        return None, None
+    return _box(det.xyxy[best_idx]), int(det.ids[best_idx]) if det.ids is not None else None
+
+
+def loop_overlap(det, reference_bbox, min_iou=0.3):
+    if reference_bbox is None or len(det.xyxy) == 0:
+        return None, None
+    best_idx, best_iou = None, None
+    for i, box in enumerate(det.xyxy):
+        iou = loop_bbox_iou(reference_bbox, [float(v) for v in box])
+        if best_iou is None or iou > best_iou:
+            best_iou, best_idx = iou, i
+    if best_iou < min_iou:
+        return None, None
+    return _box(det.xyxy[best_idx]), int(det.ids[best_idx]) if det.ids is not None else None
+
+
+def _detections(boxes, conf=None, ids=None):
+    return Detections(
+        xyxy=np.asarray(boxes, np.float32).reshape(-1, 4),
+        conf=None if conf is None else np.asarray(conf, np.float32),
+        ids=None if ids is None else np.asarray(ids, np.int64),
+        cls=np.zeros(len(boxes), np.int64),
+    )
+
+
+def _random_detections(rng, tracked):
+    n = int(rng.integers(0, 20))
+    x1 = rng.integers(0, 200, n)
+    y1 = rng.integers(0, 200, n)
+    boxes = np.stack([x1, y1, x1 + rng.integers(0, 80, n), y1 + rng.integers(0, 80, n)], axis=1)
+    # Coarse scores so equal-confidence ties show up regularly.
+    conf = rng.integers(1, 5, n) / 4.0
+    ids = rng.permutation(50)[:n] if tracked else None
+    return _detections(boxes, conf, ids)
+
+
+def _queries(rng):
+    x1, y1 = (int(v) for v in rng.integers(0, 200, 2))
+    return (x1, y1, x1 + int(rng.integers(1, 80)), y1 + int(rng.integers(1, 80))), tuple(int(v) for v in rng.integers(0, 280, 2))
+
+
+@pytest.mark.parametrize("tracked", [True, False])
+def test_vectorised_queries_match_loops_on_random_detections(tracked):
+    rng = np.random.default_rng(13)
+    for _ in range(300):
+        det = _random_detections(rng, tracked)
+        reference, (click_x, click_y) = _queries(rng)
+
+        assert get_candidate_boxes(det) == loop_candidates(det)
+        assert get_candidate_boxes(det, max_candidates=None) == loop_candidates(det, max_candidates=None)
+
+        selection = choose_target_from_click(det, click_x, click_y)
+        expected = loop_click(det, click_x, click_y)
+        assert (None if selection is None else (selection.track_id, selection.bbox)) == expected
+
+        if tracked and len(det):
+            assert find_bbox_for_track(det, int(det.ids[0])) == loop_track(det, int(det.ids[0]))
+        assert find_bbox_for_track(det, 999) == loop_track(det, 999)
+
+        for max_distance in (None, 40.0):
+            assert find_bbox_and_id_by_proximity(det, reference, max_distance) == loop_proximity(
+                det, reference, max_distance
+            )
+        for min_iou in (0.0, 0.3):
+            assert find_bbox_and_id_by_overlap(det, reference, min_iou) == loop_overlap(det, reference, min_iou)
+
+        if len(det):
+            pairwise = iou_matrix(np.asarray(reference), det.xyxy)[0]
+            expected_iou = [loop_bbox_iou(reference, [float(v) for v in box]) for box in det.xyxy]
+            np.testing.assert_allclose(pairwise, expected_iou)
+
+
+def test_queries_on_empty_detections():
+    det = Detections.empty()
+    assert get_candidate_boxes(det) == loop_candidates(det) == []
+    assert choose_target_from_click(det, 5, 5) is None
+    assert find_bbox_for_track(det, 1) is None
+    assert find_bbox_and_id_by_proximity(det, (0, 0, 10, 10)) == (None, None)
+    assert find_bbox_and_id_by_overlap(det, (0, 0, 10, 10)) == (None, None)
+    assert iou_matrix(np.zeros((0, 4)), np.zeros((0, 4))).shape == (0, 0)
+    assert find_bbox_and_id_by_proximity(det, None) == (None, None)
+    assert find_bbox_and_id_by_overlap(det, None) == (None, None)
+
+
+def test_ties_keep_the_first_detection():
+    # Two identical boxes (same centre, same IoU, same confidence) plus a farther one: the loops kept the first.
+    det = _detections([[10, 10, 30, 30], [10, 10, 30, 30], [100, 100, 120, 120]], conf=[0.5, 0.5, 0.5], ids=[7, 3, 9])
+    reference = (12, 12, 32, 32)
+
+    assert choose_target_from_click(det, 20, 20).track_id == 7 == loop_click(det, 20, 20)[0]
+    assert find_bbox_and_id_by_proximity(det, reference) == loop_proximity(det, reference) == ((10, 10, 30, 30), 7)
+    assert find_bbox_and_id_by_overlap(det, reference) == loop_overlap(det, reference) == ((10, 10, 30, 30), 7)
+    assert [c[1] for c in get_candidate_boxes(det)] == [c[1] for c in loop_candidates(det)] == [7, 3, 9]
+
+    dup_ids = _detections([[0, 0, 5, 5], [50, 50, 60, 60]], ids=[4, 4])
+    assert find_bbox_for_track(dup_ids, 4) == loop_track(dup_ids, 4) == (0, 0, 5, 5)
+
+
+def test_degenerate_boxes_have_zero_iou():
+    assert bbox_iou((0, 0, 0, 0), (0, 0, 0, 0)) == loop_bbox_iou((0, 0, 0, 0), (0, 0, 0, 0)) == 0.0
+    assert bbox_iou((0, 0, 10, 10), (20, 20, 30, 30)) == loop_bbox_iou((0, 0, 10, 10), (20, 20, 30, 30)) == 0.0
+
+
+def _scripted_detections(frames, seed=5):
+    # Three subjects moving across a 320x320 frame, dropping out now and then, with scores on both sides of
+    # ByteTrack's thresholds, plus the odd spurious box, so new, lost and unconfirmed tracks all come up.
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(20, 200, (3, 2))
+    velocity = rng.integers(-4, 5, (3, 2))
+    script = []
+    for index in range(frames):
+        rows = []
+        for (x, y), (vx, vy) in zip(starts, velocity):
+            if rng.random() < 0.85:
+                cx, cy = x + vx * index, y + vy * index
+                rows.append([cx, cy, cx + 40, cy + 60, rng.uniform(0.12, 0.9), 0])
+        if rng.random() < 0.2:
+            x, y = rng.integers(0, 260, 2)
+            rows.append([x, y, x + 30, y + 30, rng.uniform(0.12, 0.5), 0])
+        script.append(np.asarray(rows, np.float32).reshape(-1, 6))
+    return script
+
+
+def test_batch_tracker_ids_match_model_track(monkeypatch):
+    import torch
+    from ultralytics.engine.results import Results
+    from ultralytics.models.yolo.detect.predict import DetectionPredictor
+
+    from utils.tracking import BatchTracker, load_model
+
+    script = _scripted_detections(60)
+
+    # Both paths go through the predictor's postprocess, so scripting it feeds them identical detections.
+    def postprocess(self, preds, img, orig_imgs, **kwargs):
+        return [
+            Results(orig, path="", names=self.model.names, boxes=torch.as_tensor(script[int(orig[0, 0, 0])]))
+            for orig in orig_imgs
+        ]
+
+    monkeypatch.setattr(DetectionPredictor, "postprocess", postprocess)
+    frames = []
+    for index in range(len(script)):
+        frame = np.zeros((320, 320, 3), np.uint8)
+        frame[0, 0, 0] = index
+        frames.append(frame)
+
+    model = load_model("yolov8n.yaml")
+    batch_tracker = BatchTracker(model)
+    batched = []
+    for start in range(0, len(frames), 4):
+        batched += batch_tracker.track(frames[start : start + 4])
+
+    model = load_model("yolov8n.yaml")
+    tracked = [model.track(frame, persist=True, tracker="bytetrack.yaml", verbose=False)[0] for frame in frames]
+
+    for index, (ours, theirs) in enumerate(zip(batched, tracked)):
+        ours, theirs = Detections.from_result(ours), Detections.from_result(theirs)
+        assert (ours.ids is None) == (theirs.ids is None), f"frame {index}"
+        if ours.ids is not None:
+            np.testing.assert_array_equal(ours.ids, theirs.ids, err_msg=f"frame {index}")
+        np.testing.assert_allclose(ours.xyxy, theirs.xyxy, atol=1e-3, err_msg=f"frame {index}")
@@ -0,0 +1,37 @@
+import os
+import time
+
+from utils.uploads import evict_uploads
+
+
+def _write(path, size, mtime):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    os.utime(path, (mtime, mtime))
+
+
+def test_evict_uploads_counts_and_evicts_sidecars(tmp_path):
+    video = tmp_path / "video.mp4"
+    old_sidecar = tmp_path / "detections" / "old.npz"
+    new_sidecar = tmp_path / "detections" / "new.npz"
+    _write(video, 100, 1_000)
+    _write(old_sidecar, 100, 2_000)
+    _write(new_sidecar, 100, 3_000)
+
+    evict_uploads(tmp_path, max_bytes=200, keep=video)
+
+    assert video.exists()
+    assert not old_sidecar.exists()
+    assert new_sidecar.exists()
+
+
+def test_evict_uploads_spares_recently_touched_files(tmp_path):
+    old = tmp_path / "old.mp4"
+    in_use = tmp_path / "in_use.mp4"
+    _write(old, 100, 1_000)
+    _write(in_use, 100, time.time() - 60)
+
+    evict_uploads(tmp_path, max_bytes=0, grace_s=600)
+
+    assert not old.exists()
+    assert in_use.exists()
@@ -0,0 +1,444 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.motion import BoxKalman, DriftStats, FlowTracker, fast_motion_fallback
+from utils.pipeline import default_effect_workers, run_pipeline
+from utils.sidecar import DetectionRecorder, DetectionSidecar
+from utils.timing import StageTimer
+from utils.tracking import (
+    AppearanceMatcher,
+    BatchTracker,
+    Detections,
+    EmbeddingCache,
+    FocusCompositor,
+    GrabCutSegmenter,
+    LowLightEnhancer,
+    RoiTracker,
+    TrackSelection,
+    bbox_iou,
+    choose_target_from_click,
+    find_bbox_for_track,
+    get_candidate_boxes,
+    load_model,
+)
+from utils.video import FrameReader, VideoMeta, iter_frames, make_video_writer, open_video, read_frame_at
+
+
+@dataclass(frozen=True)
+class FocusOptions:
+    low_light: bool = False
+    fast_enhance: bool = False
+    luma_gate: Optional[float] = None
+    grabcut: bool = False
+    fast_motion: bool = False
+    fast_motion_tolerance: float = 2.0
+    appearance_match: bool = True
+    appearance_strictness: float = 0.55
+    blur_ksize: int = 35
+    blur_downscale: int = 1
+    detect_batch: int = 1
+    detect_stride: int = 1
+    roi_detect: bool = False
+    roi_full_every: int = 15
+    model_name: str = "yolov8n.pt"
+    tracker: str = "bytetrack.yaml"
+
+    @property
+    def keep_threshold(self) -> float:
+        return max(0.2, self.appearance_strictness - 0.1)
+
+    @property
+    def switch_threshold(self) -> float:
+        return self.appearance_strictness
+
+
+@dataclass(frozen=True)
+class ProcessResult:
+    output_path: str
+    frames: int
+    seconds: float
+    track_id: Optional[int]
+    timings: Dict[str, Dict[str, float]]
+    drift: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.seconds if self.seconds > 0 else 0.0
+
+
+class TargetTracker:
+    def __init__(
+        self,
+        matcher: Optional[AppearanceMatcher] = None,
+        keep_threshold: float = 0.45,
+        switch_threshold: float = 0.55,
+        fast_motion: bool = False,
+        fast_motion_tolerance: float = 2.0,
+    ) -> None:
+        self.matcher = matcher
+        self.keep_threshold = keep_threshold
+        self.switch_threshold = switch_threshold
+        self.fast_motion = fast_motion
+        self.fast_motion_tolerance = fast_motion_tolerance
+        self.track_id: Optional[int] = None
+        self.last_bbox: Optional[Tuple[int, int, int, int]] = None
+        self.target_embedding: Optional[np.ndarray] = None
+        self.frame_index = 0
+        self.embeddings = EmbeddingCache(frame_id=self.frame_index)
+        # Carries the bbox across frames that skip detection; re-anchored on every detection frame.
+        self.motion: Optional[BoxKalman] = None
+        self.flow = FlowTracker()
+        self.drift = DriftStats()
+        self._found = False
+        self._propagated = 0
+
+    def select(
+        self,
+        frame: np.ndarray,
+        selection: TrackSelection,
+        embedding: Optional[np.ndarray] = None,
+    ) -> None:
+        self.track_id = selection.track_id
+        self.last_bbox = selection.bbox
+        self.target_embedding = embedding
+        self.motion = BoxKalman(selection.bbox)
+        if self.fast_motion:
+            self.flow.seed(frame, selection.bbox)
+        self._found = True
+        self._propagated = 0
+        if self.matcher is not None and embedding is None:
+            self.target_embedding = self.matcher.embed_crop(frame, selection.bbox, cache=self.embeddings)
+
+    @property
+    def found(self) -> bool:
+        return self._found
+
+    def propagate(self) -> Optional[Tuple[int, int, int, int]]:
+        # A frame without detection: predict the bbox only if the target was seen last time.
+        self.frame_index += 1
+        self.embeddings.advance(self.frame_index)
+        if self.motion is None or not self._found:
+            return None
+        self._propagated += 1
+        self.last_bbox = self.motion.predict()
+        return self.last_bbox
+
+    def update(self, frame: np.ndarray, result) -> Optional[Tuple[int, int, int, int]]:
+        self.frame_index += 1
+        self.embeddings.advance(self.frame_index)
+        detections = Detections.from_result(result)
+        previous_id = self.track_id
+        predicted = self.motion.predict() if self.motion is not None else None
+
+        bbox = find_bbox_for_track(detections, self.track_id) if self.track_id is not None else None
+        if bbox is None and self.fast_motion and self.last_bbox is not None:
+            bbox, new_id = fast_motion_fallback(
+                detections, frame, self.last_bbox, self.flow, self.fast_motion_tolerance
+            )
+            if new_id is not None:
+                self.track_id = new_id
+
+        if self.matcher is not None and self.target_embedding is not None:
+            if bbox is not None:
+                current_emb = self.matcher.embed_crop(frame, bbox, cache=self.embeddings)
+                sim = self.matcher.cosine_similarity(current_emb, self.target_embedding) if current_emb is not None else -1.0
+                rematch = sim < self.keep_threshold
+            else:
+                rematch = True
+            if rematch:
+                candidates = get_candidate_boxes(detections, max_candidates=5)
+                best_bbox, best_id, best_sim = self.matcher.best_match(
+                    frame, candidates, self.target_embedding, cache=self.embeddings
+                )
+                if best_bbox is not None and best_sim >= self.switch_threshold:
+                    bbox = best_bbox
+                    self.track_id = best_id
+
+        if bbox is not None:
+            if self.motion is None or self.track_id != previous_id:
+                self.motion = BoxKalman(bbox)  # a different box: its velocity says nothing about this one
+            else:
+                if self._propagated and self._found:
+                    self.drift.add(bbox_iou(predicted, bbox))
+                self.motion.update(bbox)
+            if self.fast_motion:
+                self.flow.observe(frame, bbox)
+            self.last_bbox = bbox
+        self._found = bbox is not None
+        self._propagated = 0
+        return bbox
+
+
+def make_track_fn(model, options: FocusOptions) -> Callable[[List[np.ndarray]], List]:
+    if options.detect_batch > 1:
+        batch_tracker = BatchTracker(model, tracker=options.tracker)
+        return batch_tracker.track
+
+    def track_frames(frames: List[np.ndarray]) -> List:
+        return [model.track(f, persist=True, tracker=options.tracker, verbose=False)[0] for f in frames]
+
+    return track_frames
+
+
+# Detects on a crop around the locked target, with a full-frame pass every `full_every` calls and whenever the
+# target is lost, so a subject that left the crop is still found.
+class LockedDetector:
+    def __init__(self, tracker: RoiTracker, timer: StageTimer, full_every: int = 15) -> None:
+        self.tracker = tracker
+        self.timer = timer
+        self.full_every = max(1, full_every)
+        self.calls = 0
+
+    def __call__(self, frame: np.ndarray, target: TargetTracker):
+        full = not target.found or target.last_bbox is None or self.calls % self.full_every == 0
+        self.calls += 1
+        if full:
+            with self.timer.stage("detect"):
+                return self.tracker.track([frame])[0]
+        with self.timer.stage("detect.roi"):
+            return self.tracker.track_roi(frame, target.last_bbox)
+
+
+def select_target(
+    detections: Detections,
+    frame_index: int,
+    click: Optional[Tuple[int, int]] = None,
+    track_id: Optional[int] = None,
+) -> TrackSelection:
+    if click is not None:
+        selection = choose_target_from_click(detections, click[0], click[1])
+        if selection is None:
+            raise ValueError("No detection under the click. Please click directly on the object.")
+        return selection
+
+    bbox = find_bbox_for_track(detections, track_id)
+    if bbox is None:
+        raise ValueError(f"Track ID {track_id} is not present on frame {frame_index}.")
+    return TrackSelection(track_id=track_id, bbox=bbox)
+
+
+def render_frames(
+    cap,
+    meta: VideoMeta,
+    writer,
+    target: TargetTracker,
+    track_frames: Callable[[List[np.ndarray]], List],
+    options: FocusOptions,
+    timer: StageTimer,
+    start: int,
+    stop: Optional[int] = None,
+    enhancer: Optional[LowLightEnhancer] = None,
+    first: Optional[Tuple[np.ndarray, Optional[Tuple[int, int, int, int]]]] = None,
+    on_frame: Optional[Callable[[int], None]] = None,
+    sidecar: Optional[DetectionSidecar] = None,
+    recorder: Optional[DetectionRecorder] = None,
+    locked: Optional[LockedDetector] = None,
+) -> int:
+    effect_workers = default_effect_workers()
+    compositor = FocusCompositor(meta, buffers=effect_workers + options.detect_batch + 1)
+    segmenter = GrabCutSegmenter() if options.grabcut else None
+    stopped = threading.Event()
+
+    def segment(tracking_frame, bbox, current_id):
+        if segmenter is None or bbox is None:
+            return None
+        with timer.stage("segment"):
+            return segmenter.segment(tracking_frame, bbox, current_id)
+
+    def effect_stage(item):
+        tracking_frame, bbox, roi_mask, out = item
+        with timer.stage("effect"):
+            return compositor.compose(
+                tracking_frame,
+                bbox,
+                out,
+                roi_mask=roi_mask,
+                blur_ksize=options.blur_ksize,
+                blur_downscale=options.blur_downscale,
+            )
+
+    def write_stage(processed):
+        with timer.stage("encode"):
+            writer.write(processed)
+        compositor.release(processed)
+
+    written = 0
+    if first is not None:
+        tracking_first, first_bbox = first
+        first_mask = segment(tracking_first, first_bbox, target.track_id)
+        write_stage(effect_stage((tracking_first, first_bbox, first_mask, compositor.acquire())))
+        written += 1
+
+    def decode_stage():
+        frames = iter_frames(cap, start=start, stop=stop)
+        while True:
+            with timer.stage("decode"):
+                item = next(frames, None)
+            if item is None:
+                return
+            index, frame = item
+            yield index, enhancer(frame) if enhancer is not None else frame
+
+    # Cached detections cover every frame, so there is nothing to save by striding over them.
+    stride = 1 if sidecar is not None else max(1, options.detect_stride)
+
+    def infer_stage(batch):
+        if sidecar is not None:
+            results = [sidecar.get(index) for index, _ in batch]
+        elif locked is not None:
+            # Lazy, so each crop is taken around the box the previous frame's update just produced.
+            results = (locked(f, target) if index % stride == 0 else None for index, f in batch)
+        else:
+            detect_frames = [f for index, f in batch if index % stride == 0]
+            detected = []
+            if detect_frames:
+                with timer.stage("detect"):
+                    detected = track_frames(detect_frames)
+            detected = iter(detected)
+            results = [next(detected) if index % stride == 0 else None for index, _ in batch]
+        items = []
+        for (index, tracking_frame), result in zip(batch, results):
+            if result is None:
+                with timer.stage("propagate"):
+                    bbox = target.propagate()
+            else:
+                if recorder is not None:
+                    recorder.add(index, Detections.from_result(result))
+                with timer.stage("match"):
+                    bbox = target.update(tracking_frame, result)
+            roi_mask = segment(tracking_frame, bbox, target.track_id)
+            # Output buffers are taken here, in frame order, so the encoder always frees the oldest first.
+            items.append((tracking_frame, bbox, roi_mask, compositor.acquire(stopped)))
+        return items
+
+    return written + run_pipeline(
+        decode_stage(),
+        infer_stage,
+        effect_stage,
+        write_stage,
+        effect_workers=effect_workers,
+        batch_size=options.detect_batch,
+        on_frame=on_frame,
+        stop=stopped,
+    )
+
+
+def process_video(
+    video_path: str,
+    output_path: str,
+    selection_frame: int,
+    click: Optional[Tuple[int, int]] = None,
+    track_id: Optional[int] = None,
+    options: FocusOptions = FocusOptions(),
+    model=None,
+    matcher: Optional[AppearanceMatcher] = None,
+    frame_reader: Optional[FrameReader] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    timer: Optional[StageTimer] = None,
+    detections_path: Optional[str] = None,
+) -> ProcessResult:
+    if (click is None) == (track_id is None):
+        raise ValueError("Select the target with either a click point or a track ID.")
+
+    started = time.perf_counter()
+    timer = timer if timer is not None else StageTimer()
+    # A sidecar from an earlier run with the same detector settings replaces YOLO + ByteTrack entirely;
+    # otherwise this run records one for the next.
+    sidecar = DetectionSidecar.open(detections_path)
+    if sidecar is not None and sidecar.start != selection_frame:
+        sidecar = None
+    # Strided and ROI runs leave gaps in the detections, so only full detection of every frame records a sidecar.
+    record = detections_path is not None and sidecar is None and options.detect_stride <= 1 and not options.roi_detect
+    recorder = DetectionRecorder(selection_frame) if record else None
+    if model is None and sidecar is None:
+        model = load_model(options.model_name)
+    if not options.appearance_match:
+        matcher = None
+    elif matcher is None:
+        matcher = AppearanceMatcher()
+
+    cap, meta = open_video(video_path)
+    writer = None
+    try:
+        with timer.stage("decode"):
+            if frame_reader is not None:
+                ok_first, frame_first = frame_reader.read(selection_frame)
+            else:
+                ok_first, frame_first = read_frame_at(cap, selection_frame)
+        if not ok_first:
+            raise ValueError("Could not read the selected frame for processing.")
+
+        # ROI mode runs every detection, crop or full frame, through one tracker so IDs stay consistent.
+        roi_tracker = RoiTracker(model, tracker=options.tracker) if options.roi_detect and sidecar is None else None
+        if roi_tracker is not None:
+            track_frames = roi_tracker.track
+        else:
+            track_frames = make_track_fn(model, options) if sidecar is None else None
+        enhancer = None
+        if options.low_light:
+            enhancer = LowLightEnhancer(fast=options.fast_enhance, luma_gate=options.luma_gate, timer=timer)
+        tracking_first = enhancer(frame_first) if enhancer is not None else frame_first
+        if sidecar is not None:
+            first_detections = sidecar.get(selection_frame)
+        else:
+            with timer.stage("detect"):
+                first_detections = Detections.from_result(track_frames([tracking_first])[0])
+        if recorder is not None:
+            recorder.add(selection_frame, first_detections)
+
+        selection = select_target(first_detections, selection_frame, click=click, track_id=track_id)
+
+        target = TargetTracker(
+            matcher=matcher,
+            keep_threshold=options.keep_threshold,
+            switch_threshold=options.switch_threshold,
+            fast_motion=options.fast_motion,
+            fast_motion_tolerance=options.fast_motion_tolerance,
+        )
+        with timer.stage("match"):
+            target.select(tracking_first, selection)
+
+        writer = make_video_writer(str(output_path), meta)
+        total_frames = max(1, meta.frame_count - selection_frame)
+
+        def report_progress(index):
+            if on_progress is not None:
+                on_progress(index - selection_frame + 1, total_frames)
+
+        frames = render_frames(
+            cap,
+            meta,
+            writer,
+            target,
+            track_frames,
+            options,
+            timer,
+            start=selection_frame + 1,
+            enhancer=enhancer,
+            first=(tracking_first, selection.bbox),
+            on_frame=report_progress,
+            sidecar=sidecar,
+            recorder=recorder,
+            locked=LockedDetector(roi_tracker, timer, options.roi_full_every) if roi_tracker is not None else None,
+        )
+        if recorder is not None:
+            recorder.save(detections_path)
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+
+    return ProcessResult(
+        output_path=str(output_path),
+        frames=frames,
+        seconds=time.perf_counter() - started,
+        track_id=target.track_id,
+        timings=timer.summary(),
+        drift=target.drift.summary(),
+    )
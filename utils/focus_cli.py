@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from dataclasses import asdict
+from typing import List, Optional
+
+from utils.focus import FocusOptions, process_video
+from utils.metrics import METRIC_FORMATS, MetricsExporter
+from utils.segments import DEFAULT_OVERLAP, process_video_segmented
+from utils.sidecar import SIDECAR_DIR, sidecar_path
+from utils.timing import StageTimer, format_timings
+from utils.tracking import AppearanceMatcher, load_model
+from utils.uploads import file_hash
+
+
+def add_focus_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("input", help="Source video path.")
+    parser.add_argument("output", help="Where to write the processed .mp4.")
+    parser.add_argument("--frame", type=int, default=0, help="Frame the selection refers to; processing starts here.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--click", type=int, nargs=2, metavar=("X", "Y"), help="Pixel inside the subject on --frame.")
+    target.add_argument(
+        "--track-id",
+        type=int,
+        help="ByteTrack ID of the subject on --frame (IDs are assigned from a tracker started at --frame).",
+    )
+
+    parser.add_argument("--low-light", action="store_true", help="Apply low-light enhancement before detection.")
+    parser.add_argument("--fast-enhance", action="store_true", help="Use the fast low-light enhancer.")
+    parser.add_argument("--luma-gate", type=float, default=None, help="Skip enhancement when mean L is above this.")
+    parser.add_argument("--grabcut", action="store_true", help="Use a GrabCut mask instead of the bbox.")
+    parser.add_argument(
+        "--fast-motion",
+        action="store_true",
+        help="When the ID is lost, follow the subject with optical flow until a detection overlaps it again; "
+        "without flow, take the nearest detection.",
+    )
+    parser.add_argument("--motion-tolerance", type=float, default=2.0, help="Proximity radius in bbox sizes.")
+    parser.add_argument("--no-appearance", action="store_true", help="Disable appearance re-acquisition.")
+    parser.add_argument("--strictness", type=float, default=0.55, help="Appearance match strictness.")
+    parser.add_argument("--blur-strength", type=int, default=35, help="Gaussian kernel size for the background.")
+    parser.add_argument("--blur-downscale", type=int, default=1, help="Blur at 1/N resolution and upsample.")
+    parser.add_argument("--batch", type=int, default=1, help="Frames per detection call.")
+    parser.add_argument(
+        "--detect-stride",
+        type=int,
+        default=1,
+        help="Detect every Nth frame and carry the target box between detections with a motion model.",
+    )
+    parser.add_argument(
+        "--roi-detect",
+        action="store_true",
+        help="Detect on a crop around the target, sized to it, instead of the full frame.",
+    )
+    parser.add_argument(
+        "--roi-full-every",
+        type=int,
+        default=15,
+        help="With --roi-detect, run a full-frame detection every N detections (and whenever the target is lost).",
+    )
+    parser.add_argument("--model", default="yolov8n.pt", help="YOLO weights.")
+
+
+def options_from_args(args: argparse.Namespace) -> FocusOptions:
+    return FocusOptions(
+        low_light=args.low_light,
+        fast_enhance=args.fast_enhance,
+        luma_gate=args.luma_gate,
+        grabcut=args.grabcut,
+        fast_motion=args.fast_motion,
+        fast_motion_tolerance=args.motion_tolerance,
+        appearance_match=not args.no_appearance,
+        appearance_strictness=args.strictness,
+        blur_ksize=args.blur_strength,
+        blur_downscale=args.blur_downscale,
+        detect_batch=max(1, args.batch),
+        detect_stride=max(1, args.detect_stride),
+        roi_detect=args.roi_detect,
+        roi_full_every=max(1, args.roi_full_every),
+        model_name=args.model,
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.focus_cli",
+        description="Keep one tracked subject sharp and blur the rest of a video, without the Streamlit UI.",
+    )
+    add_focus_arguments(parser)
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="Split the video into this many segments and process them in parallel worker processes.",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for --segments (default: CPU count).")
+    parser.add_argument(
+        "--overlap",
+        type=int,
+        default=DEFAULT_OVERLAP,
+        help="Lead-in frames each segment tracks before its first written frame.",
+    )
+    parser.add_argument(
+        "--detections-cache",
+        nargs="?",
+        const=str(SIDECAR_DIR),
+        metavar="DIR",
+        help="Reuse (or record) per-frame detections in a sidecar file under DIR, so re-exports skip inference.",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the run report as JSON.")
+    parser.add_argument("--metrics", help="Also write per-stage latency to this file.")
+    parser.add_argument("--metrics-format", choices=METRIC_FORMATS, default="jsonl", help="Format of --metrics.")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.segments > 1 and args.no_appearance:
+        parser.error("--segments needs appearance matching to re-acquire the target in later segments")
+    if args.segments > 1 and args.detections_cache:
+        parser.error("--detections-cache only works with a single segment")
+    options = options_from_args(args)
+
+    click = tuple(args.click) if args.click else None
+    detections_path = None
+    if args.detections_cache:
+        detections_path = str(sidecar_path(file_hash(args.input), options, args.frame, args.detections_cache))
+    timer = StageTimer()
+    try:
+        if args.segments > 1:
+            result = process_video_segmented(
+                args.input,
+                args.output,
+                args.frame,
+                click=click,
+                track_id=args.track_id,
+                options=options,
+                model=load_model(options.model_name),
+                matcher=AppearanceMatcher(),
+                workers=args.workers,
+                segments=args.segments,
+                overlap=max(0, args.overlap),
+            )
+            timer.merge(result.timings)
+        else:
+            result = process_video(
+                args.input,
+                args.output,
+                args.frame,
+                click=click,
+                track_id=args.track_id,
+                options=options,
+                timer=timer,
+                detections_path=detections_path,
+            )
+    except ValueError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+
+    if args.metrics:
+        MetricsExporter(args.metrics, fmt=args.metrics_format).export("cli", timer, force=True)
+
+    if args.json:
+        report = asdict(result)
+        report["fps"] = result.fps
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Wrote {result.frames} frames to {result.output_path} in {result.seconds:.1f} s ({result.fps:.1f} frames/s)")
+        print(format_timings(result.timings, frames=result.frames))
+        if result.drift:
+            print(
+                f"Propagation drift: mean IoU {result.drift['mean_iou']:.3f}, min {result.drift['min_iou']:.3f} "
+                f"over {result.drift['checks']} re-anchors"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.focus import FocusOptions, process_video
+from utils.focus_cli import add_focus_arguments, options_from_args
+from utils.pipeline import limit_threads
+from utils.models import ModelPool
+from utils.tracking import AppearanceMatcher
+
+JOB_STATES = ("pending", "running", "done", "failed")
+
+
+@dataclass(frozen=True)
+class JobSpec:
+    video_path: str
+    output_path: str
+    selection_frame: int = 0
+    click: Optional[Tuple[int, int]] = None
+    track_id: Optional[int] = None
+    options: FocusOptions = field(default_factory=FocusOptions)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "JobSpec":
+        click = data.get("click")
+        return cls(
+            video_path=data["video_path"],
+            output_path=data["output_path"],
+            selection_frame=int(data.get("selection_frame", 0)),
+            click=tuple(click) if click is not None else None,
+            track_id=data.get("track_id"),
+            options=FocusOptions(**data.get("options", {})),
+        )
+
+
+# One JSON record per job, moved between state folders with atomic renames.
+class JobQueue:
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+        for state in JOB_STATES:
+            (self.root / state).mkdir(parents=True, exist_ok=True)
+        self._last_ns = 0
+
+    def _path(self, state: str, job_id: str) -> Path:
+        return self.root / state / f"{job_id}.json"
+
+    def _write(self, state: str, job_id: str, record: Dict) -> None:
+        path = self._path(state, job_id)
+        tmp_path = path.with_suffix(".part")
+        tmp_path.write_text(json.dumps(record, indent=2))
+        os.replace(tmp_path, path)
+
+    def submit(self, spec: JobSpec) -> str:
+        # Zero-padded nanosecond timestamp first so a plain sort of the pending folder is submission order, even
+        # for jobs submitted within the same second; bumped so one queue never hands out the same prefix twice.
+        self._last_ns = max(time.time_ns(), self._last_ns + 1)
+        job_id = f"{self._last_ns:020d}-{uuid.uuid4().hex[:8]}"
+        self._write("pending", job_id, {"id": job_id, "spec": spec.to_dict(), "submitted_at": time.time()})
+        return job_id
+
+    def claim(self) -> Optional[Tuple[str, Dict]]:
+        for path in sorted((self.root / "pending").glob("*.json")):
+            target = self.root / "running" / path.name
+            try:
+                os.rename(path, target)
+            except FileNotFoundError:
+                continue  # another worker won the race for this job
+            record = json.loads(target.read_text())
+            record["started_at"] = time.time()
+            record["worker"] = os.getpid()
+            self._write("running", record["id"], record)
+            return record["id"], record
+        return None
+
+    def finish(self, job_id: str, record: Dict, stats: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        record["finished_at"] = time.time()
+        if error is not None:
+            record["error"] = error
+        if stats is not None:
+            record["stats"] = stats
+        self._write("failed" if error is not None else "done", job_id, record)
+        self._path("running", job_id).unlink(missing_ok=True)
+
+    def requeue_running(self) -> int:
+        # Only safe when no worker is alive: running records are otherwise owned by a live process.
+        moved = 0
+        for path in sorted((self.root / "running").glob("*.json")):
+            os.replace(path, self.root / "pending" / path.name)
+            moved += 1
+        return moved
+
+    def counts(self) -> Dict[str, int]:
+        return {state: len(list((self.root / state).glob("*.json"))) for state in JOB_STATES}
+
+    def records(self, state: str) -> List[Dict]:
+        return [json.loads(path.read_text()) for path in sorted((self.root / state).glob("*.json"))]
+
+
+_POOLS: Dict[str, ModelPool] = {}
+_MATCHER: Optional[AppearanceMatcher] = None
+
+
+def _matcher(options: FocusOptions) -> Optional[AppearanceMatcher]:
+    global _MATCHER
+    if not options.appearance_match:
+        return None
+    if _MATCHER is None:
+        _MATCHER = AppearanceMatcher()
+    return _MATCHER
+
+
+def run_job(spec: JobSpec) -> Dict:
+    # One warm model per weights name for the worker's lifetime; the pool detaches its tracker between jobs.
+    pool = _POOLS.setdefault(spec.options.model_name, ModelPool(spec.options.model_name, max_idle=1))
+    with pool.borrow() as model:
+        result = process_video(
+            spec.video_path,
+            spec.output_path,
+            spec.selection_frame,
+            click=spec.click,
+            track_id=spec.track_id,
+            options=spec.options,
+            model=model,
+            matcher=_matcher(spec.options),
+        )
+    return {
+        "frames": result.frames,
+        "seconds": result.seconds,
+        "fps": result.fps,
+        "track_id": result.track_id,
+        "timings": result.timings,
+        "drift": result.drift,
+    }
+
+
+def work(root: str, poll_interval: float = 1.0, once: bool = False, threads: Optional[int] = None) -> int:
+    if threads is not None:
+        limit_threads(threads)
+    queue = JobQueue(root)
+    processed = 0
+    while True:
+        claimed = queue.claim()
+        if claimed is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+
+        job_id, record = claimed
+        try:
+            stats = run_job(JobSpec.from_dict(record["spec"]))
+        except Exception as exc:  # a bad clip must not take the worker down with it
+            queue.finish(job_id, record, error=f"{type(exc).__name__}: {exc}")
+        else:
+            stats["queued_s"] = record["started_at"] - record["submitted_at"]
+            queue.finish(job_id, record, stats=stats)
+        processed += 1
+
+
+def run_workers(root: str, concurrency: int = 1, poll_interval: float = 1.0, once: bool = False) -> None:
+    concurrency = max(1, concurrency)
+    threads = max(1, (os.cpu_count() or 1) // concurrency)
+    if concurrency == 1:
+        work(root, poll_interval, once, threads)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=work, args=(root, poll_interval, once, threads)) for _ in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m utils.jobs", description="Queue focus jobs and run them with warm workers.")
+    parser.add_argument("queue", help="Queue directory.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="Add a video to the queue.")
+    add_focus_arguments(submit)
+
+    work_cmd = commands.add_parser("work", help="Process queued jobs.")
+    work_cmd.add_argument("--concurrency", type=int, default=1, help="Worker processes, each with its own warm model.")
+    work_cmd.add_argument("--poll", type=float, default=1.0, help="Seconds between checks of an empty queue.")
+    work_cmd.add_argument("--once", action="store_true", help="Exit once the queue is empty.")
+
+    commands.add_parser("status", help="Show job counts and throughput.")
+    commands.add_parser("requeue", help="Move running jobs back to pending after a crash.")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    queue = JobQueue(args.queue)
+
+    if args.command == "submit":
+        spec = JobSpec(
+            video_path=str(Path(args.input).resolve()),
+            output_path=str(Path(args.output).resolve()),
+            selection_frame=args.frame,
+            click=tuple(args.click) if args.click else None,
+            track_id=args.track_id,
+            options=options_from_args(args),
+        )
+        print(queue.submit(spec))
+    elif args.command == "work":
+        run_workers(str(queue.root), concurrency=args.concurrency, poll_interval=args.poll, once=args.once)
+    elif args.command == "requeue":
+        print(f"Requeued {queue.requeue_running()} jobs")
+    else:
+        counts = queue.counts()
+        print("  ".join(f"{state}: {counts[state]}" for state in JOB_STATES))
+        for record in queue.records("done"):
+            stats = record["stats"]
+            print(f"{record['id']}  {stats['frames']:>7} frames  {stats['seconds']:>8.1f} s  {stats['fps']:>7.1f} frames/s")
+        for record in queue.records("failed"):
+            print(f"{record['id']}  failed: {record['error']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
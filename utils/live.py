@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import av
+import numpy as np
+from streamlit_webrtc import VideoProcessorBase
+
+from utils.focus import FocusOptions, LockedDetector, TargetTracker
+from utils.metrics import MetricsExporter
+from utils.models import ModelPool
+from utils.timing import StageTimer
+from utils.tracking import (
+    AppearanceMatcher,
+    Detections,
+    FocusCompositor,
+    GrabCutSegmenter,
+    LowLightEnhancer,
+    RoiTracker,
+    TrackSelection,
+    draw_boxes,
+)
+from utils.video import VideoMeta
+
+
+# The last processed frame, before effects, with the detections it was tracked with.
+@dataclass(frozen=True)
+class LiveSnapshot:
+    frame: np.ndarray
+    detections: Detections
+    track_id: Optional[int]
+    bbox: Optional[Tuple[int, int, int, int]]
+
+
+# recv() runs on webrtc's worker thread; the script only reaches it through queued select()/clear()
+# commands, configure() and snapshot().
+class LiveFocusProcessor(VideoProcessorBase):
+    def __init__(
+        self,
+        pool: ModelPool,
+        matcher: Optional[AppearanceMatcher] = None,
+        options: FocusOptions = FocusOptions(),
+        show_boxes: bool = True,
+        exporter: Optional[MetricsExporter] = None,
+        source: str = "live",
+    ) -> None:
+        self._lease = pool.lease()
+        self._matcher = matcher
+        self._commands: queue.Queue = queue.Queue()
+        self._snapshot: Optional[LiveSnapshot] = None
+        self._compositor: Optional[Tuple[FocusCompositor, np.ndarray]] = None
+        self._enhancer: Optional[LowLightEnhancer] = None
+        self._segmenter = GrabCutSegmenter()
+        self._frames = 0
+        self._detections = Detections.empty()
+        # Held by recv for a whole frame, so configure() never changes settings halfway through one.
+        self._lock = threading.Lock()
+        self.timer = StageTimer()
+        self.target = TargetTracker()
+        # Full frames and target crops go through one ByteTrack instance, so toggling the lock keeps IDs.
+        self._tracker = RoiTracker(self._lease.model, tracker=options.tracker)
+        self._locked = LockedDetector(self._tracker, self.timer, options.roi_full_every)
+        self.configure(options, show_boxes, exporter, source)
+
+    def configure(
+        self,
+        options: FocusOptions,
+        show_boxes: bool = True,
+        exporter: Optional[MetricsExporter] = None,
+        source: str = "live",
+    ) -> None:
+        with self._lock:
+            self.options = options
+            self.show_boxes = show_boxes
+            self.exporter = exporter
+            self.source = source
+            self.target.matcher = self._matcher if options.appearance_match else None
+            self.target.keep_threshold = options.keep_threshold
+            self.target.switch_threshold = options.switch_threshold
+            self.target.fast_motion = options.fast_motion
+            self.target.fast_motion_tolerance = options.fast_motion_tolerance
+            self._locked.full_every = max(1, options.roi_full_every)
+            if not options.low_light:
+                self._enhancer = None
+            elif self._enhancer is None or (self._enhancer.fast, self._enhancer.luma_gate) != (
+                options.fast_enhance,
+                options.luma_gate,
+            ):
+                self._enhancer = LowLightEnhancer(fast=options.fast_enhance, luma_gate=options.luma_gate)
+
+    def select(self, snapshot: LiveSnapshot, selection: TrackSelection) -> None:
+        # The embedding is taken from the frame the user clicked on, not whatever frame is current when
+        # the command is applied.
+        self._commands.put((snapshot.frame, selection))
+
+    def clear(self) -> None:
+        self._commands.put(None)
+
+    def snapshot(self) -> Optional[LiveSnapshot]:
+        return self._snapshot
+
+    @property
+    def track_id(self) -> Optional[int]:
+        return self.target.track_id
+
+    def _apply_commands(self) -> None:
+        while True:
+            try:
+                command = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            if command is None:
+                self.target = TargetTracker(
+                    matcher=self.target.matcher,
+                    keep_threshold=self.target.keep_threshold,
+                    switch_threshold=self.target.switch_threshold,
+                    fast_motion=self.target.fast_motion,
+                    fast_motion_tolerance=self.target.fast_motion_tolerance,
+                )
+                self._segmenter.reset()
+            else:
+                frame, selection = command
+                with self.timer.stage("match"):
+                    self.target.select(frame, selection)
+
+    def process(self, frame: np.ndarray) -> np.ndarray:
+        with self._lock:
+            self._apply_commands()
+            options = self.options
+
+            with self.timer.stage("lowlight"):
+                tracking_frame = self._enhancer(frame) if self._enhancer is not None else frame
+
+            # Between detection frames the box comes from the motion model; boxes drawn are the last detected.
+            if self._frames % max(1, options.detect_stride) == 0:
+                if options.roi_detect:
+                    detections = Detections.from_result(self._locked(tracking_frame, self.target))
+                else:
+                    with self.timer.stage("detect"):
+                        detections = Detections.from_result(self._tracker.track([tracking_frame])[0])
+                with self.timer.stage("match"):
+                    bbox = self.target.update(tracking_frame, detections)
+                self._detections = detections
+                # Only detection frames are snapshotted, so a click is resolved against boxes of that same frame.
+                self._snapshot = LiveSnapshot(tracking_frame, detections, self.target.track_id, bbox)
+            else:
+                detections = self._detections
+                with self.timer.stage("propagate"):
+                    bbox = self.target.propagate()
+            self._frames += 1
+
+            if self._compositor is None or self._compositor[0].shape != tracking_frame.shape:
+                height, width = tracking_frame.shape[:2]
+                compositor = FocusCompositor(VideoMeta(width=width, height=height, fps=0.0, frame_count=0), buffers=1)
+                self._compositor = (compositor, compositor.acquire())
+            compositor, compose_out = self._compositor
+
+            output = tracking_frame
+            if self.target.track_id is not None and bbox is not None:
+                roi_mask = None
+                if options.grabcut:
+                    with self.timer.stage("segment"):
+                        roi_mask = self._segmenter.segment(tracking_frame, bbox, self.target.track_id)
+                with self.timer.stage("effect"):
+                    output = compositor.compose(
+                        tracking_frame,
+                        bbox,
+                        compose_out,
+                        roi_mask=roi_mask,
+                        blur_ksize=options.blur_ksize,
+                        blur_downscale=options.blur_downscale,
+                    )
+
+            if self.show_boxes:
+                with self.timer.stage("draw"):
+                    output = draw_boxes(output, detections, inplace=output is compose_out)
+
+            if self.exporter is not None:
+                self.exporter.export(self.source, self.timer)
+            return output
+
+    def recv(self, frame: av.VideoFrame) -> av.VideoFrame:
+        started = time.perf_counter()
+        image = frame.to_ndarray(format="bgr24")
+        decode_s = time.perf_counter() - started
+        output = self.process(image)
+        # from_ndarray copies, so the compositor's single output buffer is free again for the next frame.
+        started = time.perf_counter()
+        out_frame = av.VideoFrame.from_ndarray(output, format="bgr24")
+        out_frame.pts = frame.pts
+        out_frame.time_base = frame.time_base
+        self.timer.add("transfer", decode_s + time.perf_counter() - started)
+        return out_frame
+
+    def on_ended(self) -> None:
+        self._lease.close()
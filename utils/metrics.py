@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from utils.timing import StageTimer
+
+METRIC_FORMATS = ("jsonl", "prometheus")
+
+
+def _stage_record(stats: Dict[str, float]) -> Dict[str, float]:
+    record = {"count": int(stats["count"]), "mean_ms": stats["ms_per_call"]}
+    if "p95_ms" in stats:
+        record["p50_ms"] = stats["p50_ms"]
+        record["p95_ms"] = stats["p95_ms"]
+    return record
+
+
+def format_prometheus(timings_by_source: Dict[str, Dict[str, Dict[str, float]]], prefix: str = "bullseye") -> str:
+    metrics = (
+        ("stage_latency_ms", "summary", "Per-stage latency in milliseconds; quantiles over the rolling window."),
+        ("stage_latency_mean_ms", "gauge", "Mean per-stage latency in milliseconds since the timer was created."),
+        ("stage_calls_total", "counter", "Stage invocations since the timer was created."),
+    )
+    lines = []
+    for metric, kind, help_text in metrics:
+        lines += [f"# HELP {prefix}_{metric} {help_text}", f"# TYPE {prefix}_{metric} {kind}"]
+        for source, timings in sorted(timings_by_source.items()):
+            for stage, stats in sorted(timings.items()):
+                labels = f'source="{source}",stage="{stage}"'
+                if metric == "stage_latency_ms":
+                    if "p95_ms" in stats:
+                        lines.append(f'{prefix}_{metric}{{{labels},quantile="0.5"}} {stats["p50_ms"]:.4f}')
+                        lines.append(f'{prefix}_{metric}{{{labels},quantile="0.95"}} {stats["p95_ms"]:.4f}')
+                    lines.append(f"{prefix}_{metric}_sum{{{labels}}} {1000.0 * stats['total_s']:.4f}")
+                    lines.append(f"{prefix}_{metric}_count{{{labels}}} {int(stats['count'])}")
+                elif metric == "stage_latency_mean_ms":
+                    lines.append(f"{prefix}_{metric}{{{labels}}} {stats['ms_per_call']:.4f}")
+                else:
+                    lines.append(f"{prefix}_{metric}{{{labels}}} {int(stats['count'])}")
+    return "\n".join(lines) + "\n"
+
+
+# At most one snapshot per interval_s per source. "jsonl" appends a line per snapshot; "prometheus" rewrites a
+# node-exporter textfile with the latest snapshot of every source heard from in the last stale_s.
+class MetricsExporter:
+    def __init__(self, path: str, fmt: str = "jsonl", interval_s: float = 5.0, stale_s: float = 300.0) -> None:
+        if fmt not in METRIC_FORMATS:
+            raise ValueError(f"Unknown metrics format {fmt!r}; expected one of {METRIC_FORMATS}.")
+        self.path = Path(path)
+        self.fmt = fmt
+        self.interval_s = interval_s
+        self.stale_s = stale_s
+        self._latest: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self._written_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def export(self, source: str, timer: StageTimer, force: bool = False) -> bool:
+        now = time.time()
+        with self._lock:
+            if not force and now - self._written_at.get(source, 0.0) < self.interval_s:
+                return False
+            self._written_at[source] = now
+            timings = timer.summary()
+            self._latest[source] = timings
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.fmt == "jsonl":
+                record = {
+                    "ts": now,
+                    "source": source,
+                    "stages": {stage: _stage_record(stats) for stage, stats in timings.items()},
+                }
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+            else:
+                # Sources from closed sessions stop reporting; drop them rather than serve their last snapshot forever.
+                for stale in [name for name, at in self._written_at.items() if now - at > self.stale_s]:
+                    del self._written_at[stale]
+                    self._latest.pop(stale, None)
+                # Scrapers may read at any moment; never let them see a half-written file.
+                tmp_path = self.path.with_name(self.path.name + ".part")
+                tmp_path.write_text(format_prometheus(self._latest))
+                os.replace(tmp_path, self.path)
+        return True
+
+
+def default_metrics_path(fmt: str, directory: Optional[str] = None) -> str:
+    directory = directory or os.path.join(tempfile.gettempdir(), "bullseye_metrics")
+    return os.path.join(directory, "stages.jsonl" if fmt == "jsonl" else "bullseye.prom")
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Iterator, List
+
+import numpy as np
+
+from utils.tracking import load_model, reset_tracker
+
+
+# Warm YOLO models handed to one user at a time; the tracker is detached on return, the weights never reloaded.
+class ModelPool:
+    def __init__(self, model_name: str = "yolov8n.pt", max_idle: int = 4, warmup_size: int = 640) -> None:
+        self.model_name = model_name
+        self.max_idle = max_idle
+        self.warmup_size = warmup_size
+        self.loaded = 0
+        self._idle: List = []
+        self._lock = threading.Lock()
+
+    def _load(self):
+        model = load_model(self.model_name)
+        # The first predict call builds the predictor and fuses layers; pay for it here, not on a user's frame.
+        model.predict(np.zeros((self.warmup_size, self.warmup_size, 3), np.uint8), verbose=False)
+        with self._lock:
+            self.loaded += 1
+        return model
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._load()
+
+    def release(self, model) -> None:
+        reset_tracker(model)
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(model)
+
+    @contextmanager
+    def borrow(self) -> Iterator:
+        model = self.acquire()
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def lease(self) -> "ModelLease":
+        return ModelLease(self)
+
+
+# Holds a pooled model until closed or garbage-collected, e.g. when a Streamlit session goes away.
+class ModelLease:
+    def __init__(self, pool: ModelPool) -> None:
+        self.model = pool.acquire()
+        self._finalizer = weakref.finalize(self, pool.release, self.model)
+
+    def reset_tracker(self) -> None:
+        reset_tracker(self.model)
+
+    def close(self) -> None:
+        self._finalizer()
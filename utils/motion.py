@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.tracking import Detections, find_bbox_and_id_by_overlap, find_bbox_and_id_by_proximity
+
+# A detection must overlap the flow estimate this much to take tracking back to its ID.
+FLOW_HANDBACK_IOU = 0.3
+
+_F = np.eye(8)
+_F[:4, 4:] = np.eye(4)
+_H = np.eye(4, 8)
+
+
+# Constant-velocity Kalman filter over a box's centre and size. Noise scales with the box size, as in ByteTrack's
+# filter, so the same weights hold for near and far subjects.
+class BoxKalman:
+    def __init__(
+        self,
+        bbox: Tuple[int, int, int, int],
+        position_weight: float = 1.0 / 20,
+        velocity_weight: float = 1.0 / 160,
+    ) -> None:
+        self.position_weight = position_weight
+        self.velocity_weight = velocity_weight
+        self.x = np.zeros(8)
+        self.x[:4] = self._measure(bbox)
+        size = self._size()
+        std = [2 * position_weight * size] * 4 + [10 * velocity_weight * size] * 4
+        self.P = np.diag(np.square(std))
+
+    @staticmethod
+    def _measure(bbox: Tuple[int, int, int, int]) -> np.ndarray:
+        x1, y1, x2, y2 = bbox
+        return np.array([(x1 + x2) / 2.0, (y1 + y2) / 2.0, float(x2 - x1), float(y2 - y1)])
+
+    def _size(self) -> float:
+        return max(1.0, self.x[2], self.x[3])
+
+    @property
+    def bbox(self) -> Tuple[int, int, int, int]:
+        cx, cy, w, h = self.x[:4]
+        w, h = max(1.0, w), max(1.0, h)
+        return int(round(cx - w / 2)), int(round(cy - h / 2)), int(round(cx + w / 2)), int(round(cy + h / 2))
+
+    def predict(self) -> Tuple[int, int, int, int]:
+        size = self._size()
+        q = np.square([self.position_weight * size] * 4 + [self.velocity_weight * size] * 4)
+        self.x = _F @ self.x
+        self.P = _F @ self.P @ _F.T + np.diag(q)
+        return self.bbox
+
+    def update(self, bbox: Tuple[int, int, int, int]) -> None:
+        r = np.square([self.position_weight * self._size()] * 4)
+        s = _H @ self.P @ _H.T + np.diag(r)
+        gain = np.linalg.solve(s, _H @ self.P).T
+        self.x = self.x + gain @ (self._measure(bbox) - _H @ self.x)
+        self.P = (np.eye(8) - gain @ _H) @ self.P
+
+
+# IoU between a propagated bbox and the detection that re-anchors it, one check per re-anchor.
+class DriftStats:
+    def __init__(self) -> None:
+        self.checks = 0
+        self.total = 0.0
+        self.minimum = 1.0
+
+    def add(self, iou: float) -> None:
+        self.checks += 1
+        self.total += iou
+        self.minimum = min(self.minimum, iou)
+
+    def merge(self, summary: Dict[str, float]) -> None:
+        if summary.get("checks"):
+            self.checks += int(summary["checks"])
+            self.total += summary["mean_iou"] * summary["checks"]
+            self.minimum = min(self.minimum, summary["min_iou"])
+
+    def summary(self) -> Dict[str, float]:
+        if not self.checks:
+            return {}
+        return {"checks": self.checks, "mean_iou": self.total / self.checks, "min_iou": self.minimum}
+
+
+# Pyramidal Lucas-Kanade on corners inside the target box, run on a crop around it. Forward-backward checks drop
+# background corners; the box follows the median shift and the median change in point spread.
+class FlowTracker:
+    def __init__(
+        self,
+        max_points: int = 40,
+        min_points: int = 5,
+        search: float = 0.5,
+        max_error: float = 1.0,
+        max_coast: int = 30,
+    ) -> None:
+        self.max_points = max_points
+        self.min_points = min_points
+        self.search = search
+        self.max_error = max_error
+        self.max_coast = max_coast
+        self.lk_params = dict(
+            winSize=(15, 15),
+            maxLevel=3,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03),
+        )
+        self.reset()
+
+    def reset(self) -> None:
+        self.estimate: Optional[Tuple[int, int, int, int]] = None
+        self.coasting = 0
+        self._region: Optional[Tuple[int, int, int, int]] = None
+        self._prev: Optional[np.ndarray] = None
+        self._points: Optional[np.ndarray] = None
+        self._bbox: Optional[Tuple[int, int, int, int]] = None
+
+    def _gray(self, frame: np.ndarray, region: Tuple[int, int, int, int]) -> np.ndarray:
+        x1, y1, x2, y2 = region
+        return cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+
+    def seed(self, frame: np.ndarray, bbox: Tuple[int, int, int, int]) -> None:
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = max(0, bbox[0]), max(0, bbox[1]), min(width, bbox[2]), min(height, bbox[3])
+        self.reset()
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return
+        pad_x, pad_y = int((x2 - x1) * self.search), int((y2 - y1) * self.search)
+        region = (max(0, x1 - pad_x), max(0, y1 - pad_y), min(width, x2 + pad_x), min(height, y2 + pad_y))
+        gray = self._gray(frame, region)
+        inner = gray[y1 - region[1] : y2 - region[1], x1 - region[0] : x2 - region[0]]
+        corners = cv2.goodFeaturesToTrack(inner, self.max_points, 0.01, 4)
+        if corners is None or len(corners) < self.min_points:
+            return
+        # Points are kept in region coordinates; the box is stored as given so it can leave the frame edge.
+        self._points = corners.reshape(-1, 2) + np.float32([x1 - region[0], y1 - region[1]])
+        self._region = region
+        self._prev = gray
+        self._bbox = tuple(bbox)
+
+    def observe(self, frame: np.ndarray, bbox: Tuple[int, int, int, int]) -> None:
+        # Re-seed from a bbox found some other way; one track() produced is already seeded.
+        if bbox != self.estimate:
+            self.seed(frame, bbox)
+
+    def track(self, frame: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        if self._points is None or self.coasting >= self.max_coast:
+            return None
+        gray = self._gray(frame, self._region)
+        prev_pts = self._points.reshape(-1, 1, 2)
+        next_pts, status, _ = cv2.calcOpticalFlowPyrLK(self._prev, gray, prev_pts, None, **self.lk_params)
+        back_pts, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self._prev, next_pts, None, **self.lk_params)
+        error = np.linalg.norm(back_pts - prev_pts, axis=2).ravel()
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < self.max_error)
+        if good.sum() < self.min_points:
+            self._points = None
+            return None
+
+        before, after = prev_pts[good, 0], next_pts[good, 0]
+        dx, dy = np.median(after - before, axis=0)
+        i, j = np.triu_indices(len(before), k=1)
+        spread_before = np.linalg.norm(before[i] - before[j], axis=1)
+        spread_after = np.linalg.norm(after[i] - after[j], axis=1)
+        valid = spread_before > 1e-3
+        scale = float(np.median(spread_after[valid] / spread_before[valid])) if valid.any() else 1.0
+        scale = min(1.25, max(0.8, scale))
+
+        x1, y1, x2, y2 = self._bbox
+        cx, cy = (x1 + x2) / 2.0 + dx, (y1 + y2) / 2.0 + dy
+        half_w, half_h = (x2 - x1) * scale / 2.0, (y2 - y1) * scale / 2.0
+        bbox = (int(round(cx - half_w)), int(round(cy - half_h)), int(round(cx + half_w)), int(round(cy + half_h)))
+
+        coasting = self.coasting + 1
+        self.seed(frame, bbox)
+        self.coasting = coasting
+        self.estimate = bbox
+        return bbox
+
+
+def fast_motion_fallback(
+    detections: Detections,
+    frame: np.ndarray,
+    last_bbox: Tuple[int, int, int, int],
+    flow: FlowTracker,
+    tolerance: float = 2.0,
+    handback_iou: float = FLOW_HANDBACK_IOU,
+) -> Tuple[Optional[Tuple[int, int, int, int]], Optional[int]]:
+    # A detection overlapping the flow estimate hands tracking back to IDs, otherwise the flow box stands in (with
+    # no ID); the nearest detection within `tolerance` box sizes is the last resort.
+    flow_bbox = flow.track(frame)
+    if flow_bbox is not None:
+        bbox, track_id = find_bbox_and_id_by_overlap(detections, flow_bbox, min_iou=handback_iou)
+        if track_id is not None:
+            return bbox, track_id
+        return flow_bbox, None
+
+    bbox_w = max(1, last_bbox[2] - last_bbox[0])
+    bbox_h = max(1, last_bbox[3] - last_bbox[1])
+    return find_bbox_and_id_by_proximity(detections, last_bbox, max(bbox_w, bbox_h) * tolerance)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def default_effect_workers() -> int:
+    return max(1, min(4, (os.cpu_count() or 2) - 2))
+
+
+def limit_threads(threads: int) -> None:
+    # Worker processes share the machine; without this each one sizes its OpenCV/torch pools to every core.
+    import cv2
+
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def run_pipeline(
+    frames: Iterable[Tuple[int, np.ndarray]],
+    infer: Callable[[List[Tuple[int, np.ndarray]]], List[T]],
+    effect: Callable[[T], np.ndarray],
+    write: Callable[[np.ndarray], None],
+    effect_workers: Optional[int] = None,
+    queue_size: int = 8,
+    batch_size: int = 1,
+    on_frame: Optional[Callable[[int], None]] = None,
+    stop: Optional[threading.Event] = None,
+) -> int:
+    # Decode (and whatever preprocessing is folded into ``frames``) runs on its own
+    # thread, ``infer`` stays on the caller and sees batches of up to ``batch_size``
+    # frames in order so trackers remain causal, ``effect`` fans out to a pool and
+    # ``write`` drains results in submission order. ``stop`` is set as soon as any
+    # stage fails, so callers can pass it to anything else that might block.
+    workers = effect_workers or default_effect_workers()
+    stop = stop if stop is not None else threading.Event()
+    errors: List[BaseException] = []
+    decoded: queue.Queue = queue.Queue(maxsize=queue_size)
+    rendered: queue.Queue = queue.Queue(maxsize=queue_size + workers + batch_size)
+
+    def decode() -> None:
+        try:
+            for item in frames:
+                if not _put(decoded, item, stop):
+                    return
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
+        finally:
+            _put(decoded, _DONE, stop)
+
+    def encode() -> None:
+        try:
+            while True:
+                future = _get(rendered, stop)
+                if future is _DONE:
+                    return
+                write(future.result())
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
+
+    decoder = threading.Thread(target=decode, name="pipeline-decode", daemon=True)
+    encoder = threading.Thread(target=encode, name="pipeline-encode", daemon=True)
+    decoder.start()
+    encoder.start()
+
+    count = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline-effect") as pool:
+        try:
+            exhausted = False
+            while not exhausted:
+                batch = []
+                while len(batch) < batch_size:
+                    item = _get(decoded, stop)
+                    if item is _DONE:
+                        exhausted = True
+                        break
+                    batch.append(item)
+                if not batch:
+                    break
+                for (index, _), inferred in zip(batch, infer(batch)):
+                    future: Future = pool.submit(effect, inferred)
+                    if not _put(rendered, future, stop):
+                        exhausted = True
+                        break
+                    count += 1
+                    if on_frame is not None:
+                        on_frame(index)
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
+        finally:
+            _put(rendered, _DONE, stop)
+            encoder.join()
+            stop.set()
+            decoder.join()
+
+    if errors:
+        raise errors[0]
+    return count
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.focus import FocusOptions, LockedDetector, ProcessResult, TargetTracker, render_frames, select_target
+from utils.motion import DriftStats
+from utils.pipeline import limit_threads
+from utils.timing import StageTimer
+from utils.tracking import (
+    AppearanceMatcher,
+    BatchTracker,
+    Detections,
+    LowLightEnhancer,
+    RoiTracker,
+    TrackSelection,
+    bbox_iou,
+    find_bbox_and_id_by_overlap,
+    get_candidate_boxes,
+    load_model,
+)
+from utils.video import VideoMeta, iter_frames, make_video_writer, open_video, read_frame_at
+
+DEFAULT_OVERLAP = 30
+HANDOFF_IOU = 0.5
+SEED_MIN_IOU = 0.3
+
+
+@dataclass(frozen=True)
+class Segment:
+    index: int
+    lead_in: int
+    start: int
+    stop: int
+
+    @property
+    def anchor(self) -> int:
+        # The frame the target is picked up on: the last lead-in frame, or the first frame when there is no lead-in.
+        return self.start if self.lead_in == self.start else self.start - 1
+
+
+@dataclass(frozen=True)
+class SegmentJob:
+    video_path: str
+    output_path: str
+    segment: Segment
+    options: FocusOptions
+    target_embedding: Optional[np.ndarray] = None
+    anchor_bbox: Optional[Tuple[int, int, int, int]] = None
+    # Workers must embed crops the same way the target embedding was made.
+    matcher_mode: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class SegmentResult:
+    segment: Segment
+    output_path: str
+    frames: int
+    entry_bbox: Optional[Tuple[int, int, int, int]]
+    exit_bbox: Optional[Tuple[int, int, int, int]]
+    timings: Dict[str, Dict[str, float]]
+    drift: Dict[str, float] = field(default_factory=dict)
+
+
+def plan_segments(first: int, stop: int, count: int, overlap: int = DEFAULT_OVERLAP) -> List[Segment]:
+    total = max(1, stop - first)
+    # Keep every segment at least twice its lead-in, otherwise the warm-up costs more than the split saves.
+    count = max(1, min(count, total // max(1, 2 * overlap)))
+    bounds = np.linspace(first, first + total, count + 1).round().astype(int)
+    segments = []
+    for index, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        lead_in = first if index == 0 else max(first, int(start) - overlap)
+        segments.append(Segment(index=index, lead_in=lead_in, start=int(start), stop=int(end)))
+    return segments
+
+
+_WORKER_RESOURCES: Dict[Tuple[str, Optional[str]], Tuple[object, Optional[AppearanceMatcher]]] = {}
+
+
+def _worker_resources(job: SegmentJob) -> Tuple[object, Optional[AppearanceMatcher]]:
+    mode = job.matcher_mode if job.options.appearance_match else None
+    key = (job.options.model_name, mode)
+    if key not in _WORKER_RESOURCES:
+        matcher = AppearanceMatcher(use_pretrained=mode == "torch") if mode is not None else None
+        _WORKER_RESOURCES[key] = (load_model(job.options.model_name), matcher)
+    return _WORKER_RESOURCES[key]
+
+
+def _acquire(
+    job: SegmentJob,
+    frame: np.ndarray,
+    detections: Detections,
+    matcher: Optional[AppearanceMatcher],
+) -> Optional[TrackSelection]:
+    if job.anchor_bbox is not None:
+        bbox, track_id = find_bbox_and_id_by_overlap(detections, job.anchor_bbox, min_iou=SEED_MIN_IOU)
+    elif matcher is not None and job.target_embedding is not None:
+        candidates = get_candidate_boxes(detections, max_candidates=None)
+        bbox, track_id, sim = matcher.best_match(frame, candidates, job.target_embedding)
+        if sim < job.options.switch_threshold:
+            bbox = None
+    else:
+        bbox = None
+    return TrackSelection(track_id=track_id, bbox=bbox) if bbox is not None else None
+
+
+def run_segment(job: SegmentJob) -> SegmentResult:
+    options = job.options
+    segment = job.segment
+    model, matcher = _worker_resources(job)
+    timer = StageTimer()
+
+    # A fresh tracker per segment: ByteTrack state must not leak between jobs sharing a worker.
+    roi_tracker = RoiTracker(model, tracker=options.tracker) if options.roi_detect else None
+    track_frames = (roi_tracker or BatchTracker(model, tracker=options.tracker)).track
+    enhancer = None
+    if options.low_light:
+        enhancer = LowLightEnhancer(fast=options.fast_enhance, luma_gate=options.luma_gate, timer=timer)
+    target = TargetTracker(
+        matcher=matcher,
+        keep_threshold=options.keep_threshold,
+        switch_threshold=options.switch_threshold,
+        fast_motion=options.fast_motion,
+        fast_motion_tolerance=options.fast_motion_tolerance,
+    )
+    target.target_embedding = job.target_embedding
+
+    cap, meta = open_video(job.video_path)
+    writer = None
+    try:
+        anchor_frame, anchor_result = None, None
+        for _, frame in iter_frames(cap, start=segment.lead_in, stop=segment.anchor + 1):
+            anchor_frame = enhancer(frame) if enhancer is not None else frame
+            with timer.stage("detect"):
+                anchor_result = track_frames([anchor_frame])[0]
+        if anchor_frame is None:
+            raise ValueError(f"Could not read frame {segment.anchor} for segment {segment.index}.")
+
+        with timer.stage("match"):
+            selection = _acquire(job, anchor_frame, Detections.from_result(anchor_result), matcher)
+            if selection is not None:
+                target.select(anchor_frame, selection, embedding=job.target_embedding)
+        entry_bbox = target.last_bbox
+
+        writer = make_video_writer(job.output_path, meta)
+        frames = render_frames(
+            cap,
+            meta,
+            writer,
+            target,
+            track_frames,
+            options,
+            timer,
+            start=segment.anchor + 1,
+            stop=segment.stop,
+            enhancer=enhancer,
+            first=(anchor_frame, entry_bbox) if segment.anchor == segment.start else None,
+            locked=LockedDetector(roi_tracker, timer, options.roi_full_every) if roi_tracker is not None else None,
+        )
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+
+    return SegmentResult(
+        segment=segment,
+        output_path=job.output_path,
+        frames=frames,
+        entry_bbox=entry_bbox,
+        exit_bbox=target.last_bbox,
+        timings=timer.summary(),
+        drift=target.drift.summary(),
+    )
+
+
+def concat_segments(paths: List[str], output_path: str, meta: VideoMeta) -> None:
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is not None:
+        list_path = Path(paths[0]).with_name("segments.txt")
+        lines = ["file '{}'".format(str(Path(p).resolve()).replace("'", "'\\''")) for p in paths]
+        list_path.write_text("\n".join(lines) + "\n")
+        completed = subprocess.run(
+            [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", str(list_path), "-c", "copy", output_path],
+            capture_output=True,
+        )
+        if completed.returncode == 0:
+            return
+
+    # No ffmpeg (or it refused the inputs): re-encode through OpenCV instead of stream-copying.
+    writer = make_video_writer(output_path, meta)
+    try:
+        for path in paths:
+            cap, _ = open_video(path)
+            try:
+                for _, frame in iter_frames(cap):
+                    writer.write(frame)
+            finally:
+                cap.release()
+    finally:
+        writer.release()
+
+
+def _hand_off(pool, jobs: List[SegmentJob], results: List[SegmentResult], timer: StageTimer) -> None:
+    # A segment whose entry does not overlap the previous exit picked the wrong subject by appearance, so re-run
+    # it seeded with where the previous segment left the target. Mismatches whose predecessor is not itself being
+    # re-run go out together; the rest wait a round and are checked again against the new exit. A run of
+    # consecutive mismatches therefore still costs one segment per round.
+    dirty = set(range(1, len(results)))
+    while dirty:
+        rerun: List[int] = []
+        waiting = set()
+        for index in sorted(dirty):
+            previous, current = results[index - 1], results[index]
+            if previous.exit_bbox is None:
+                continue
+            if current.entry_bbox is not None and bbox_iou(previous.exit_bbox, current.entry_bbox) >= HANDOFF_IOU:
+                continue
+            if index - 1 in rerun or index - 1 in waiting:
+                waiting.add(index)
+            else:
+                rerun.append(index)
+        if not rerun:
+            return
+        with timer.stage("handoff"):
+            futures = {
+                pool.submit(run_segment, replace(jobs[index], anchor_bbox=results[index - 1].exit_bbox)): index
+                for index in rerun
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        dirty = waiting | {index + 1 for index in rerun if index + 1 < len(results)}
+
+
+def process_video_segmented(
+    video_path: str,
+    output_path: str,
+    selection_frame: int,
+    click: Optional[Tuple[int, int]] = None,
+    track_id: Optional[int] = None,
+    options: FocusOptions = FocusOptions(),
+    model=None,
+    matcher: Optional[AppearanceMatcher] = None,
+    workers: Optional[int] = None,
+    segments: Optional[int] = None,
+    overlap: int = DEFAULT_OVERLAP,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    work_dir: Optional[str] = None,
+) -> ProcessResult:
+    if (click is None) == (track_id is None):
+        raise ValueError("Select the target with either a click point or a track ID.")
+
+    started = time.perf_counter()
+    timer = StageTimer()
+    workers = max(1, workers or os.cpu_count() or 1)
+    if model is None:
+        model = load_model(options.model_name)
+    if not options.appearance_match:
+        matcher = None
+    elif matcher is None:
+        matcher = AppearanceMatcher()
+
+    cap, meta = open_video(video_path)
+    try:
+        with timer.stage("decode"):
+            ok_first, frame_first = read_frame_at(cap, selection_frame)
+    finally:
+        cap.release()
+    if not ok_first:
+        raise ValueError("Could not read the selected frame for processing.")
+
+    # Resolve the selection once, here, so every segment hunts for the same appearance embedding.
+    if options.low_light:
+        frame_first = LowLightEnhancer(fast=options.fast_enhance, luma_gate=options.luma_gate)(frame_first)
+    with timer.stage("detect"):
+        first_result = BatchTracker(model, tracker=options.tracker).track([frame_first])[0]
+    selection = select_target(Detections.from_result(first_result), selection_frame, click=click, track_id=track_id)
+    embedding = None
+    if matcher is not None:
+        with timer.stage("match"):
+            embedding = matcher.embed_crop(frame_first, selection.bbox)
+
+    plan = plan_segments(selection_frame, meta.frame_count, segments or workers, overlap)
+    # Later segments can only find the target by appearance; without an embedding each one would be re-run
+    # serially by the handoff below, which is slower than a single pass.
+    if embedding is None and len(plan) > 1:
+        raise ValueError("Parallel segments need appearance matching to find the target; use one segment instead.")
+    total_frames = max(1, meta.frame_count - selection_frame)
+    scratch = Path(tempfile.mkdtemp(prefix="bullseye_segments_", dir=work_dir))
+    jobs = [
+        SegmentJob(
+            video_path=str(video_path),
+            output_path=str(scratch / f"segment_{segment.index:04d}.mp4"),
+            segment=segment,
+            options=options,
+            target_embedding=embedding,
+            anchor_bbox=selection.bbox if segment.index == 0 else None,
+            matcher_mode=matcher.mode if matcher is not None else None,
+        )
+        for segment in plan
+    ]
+
+    pool_size = min(workers, len(jobs))
+    threads = max(1, (os.cpu_count() or 1) // pool_size)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=pool_size,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=limit_threads,
+            initargs=(threads,),
+        ) as pool:
+            results: List[Optional[SegmentResult]] = [None] * len(jobs)
+            done_frames = 0
+            futures = {pool.submit(run_segment, job): job.segment.index for job in jobs}
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                done_frames += result.frames
+                if on_progress is not None:
+                    on_progress(done_frames, total_frames)
+            _hand_off(pool, jobs, results, timer)
+
+        drift = DriftStats()
+        for result in results:
+            timer.merge(result.timings)
+            drift.merge(result.drift)
+        with timer.stage("concat"):
+            concat_segments([result.output_path for result in results], str(output_path), meta)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    return ProcessResult(
+        output_path=str(output_path),
+        frames=sum(result.frames for result in results),
+        seconds=time.perf_counter() - started,
+        track_id=selection.track_id,
+        timings=timer.summary(),
+        drift=drift.summary(),
+    )
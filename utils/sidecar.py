@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
+
+import numpy as np
+
+from utils.tracking import Detections
+from utils.uploads import UPLOAD_CACHE_DIR
+
+if TYPE_CHECKING:
+    from utils.focus import FocusOptions
+
+SIDECAR_DIR = UPLOAD_CACHE_DIR / "detections"
+SIDECAR_VERSION = 1
+
+
+def detection_settings_key(options: FocusOptions) -> str:
+    # Only settings that change what the detector sees or how IDs are assigned; effect settings are left out
+    # on purpose so re-exports with a different blur or strictness reuse the same file.
+    settings = {"model": options.model_name, "tracker": options.tracker, "low_light": options.low_light}
+    if options.low_light:
+        settings.update(fast_enhance=options.fast_enhance, luma_gate=options.luma_gate)
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def sidecar_path(video_key: str, options: FocusOptions, start_frame: int, cache_dir: Path = SIDECAR_DIR) -> Path:
+    return Path(cache_dir) / f"{video_key[:24]}_{detection_settings_key(options)}_{start_frame:07d}.npz"
+
+
+def find_sidecar(
+    video_key: str,
+    options: FocusOptions,
+    frame_index: int,
+    cache_dir: Path = SIDECAR_DIR,
+) -> Optional[Path]:
+    # The sidecar for these settings whose tracker started closest before frame_index.
+    best = None
+    for path in Path(cache_dir).glob(f"{video_key[:24]}_{detection_settings_key(options)}_*.npz"):
+        start = int(path.stem.rsplit("_", 1)[1])
+        if start <= frame_index and (best is None or start > best[0]):
+            best = (start, path)
+    return best[1] if best is not None else None
+
+
+# One Detections per consecutive frame, written as a CSR-style .npz.
+class DetectionRecorder:
+    def __init__(self, start: int) -> None:
+        self.start = start
+        self.frames: List[Detections] = []
+
+    def add(self, index: int, detections: Detections) -> None:
+        if index != self.start + len(self.frames):
+            raise ValueError(f"Frame {index} recorded out of order; expected {self.start + len(self.frames)}.")
+        self.frames.append(detections)
+
+    def save(self, path: Path) -> None:
+        counts = np.array([len(d) for d in self.frames], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        total = int(offsets[-1])
+
+        def column(name: str, width: Optional[int], dtype, fill) -> np.ndarray:
+            shape = (total, width) if width else (total,)
+            out = np.full(shape, fill, dtype=dtype)
+            for detections, lo, hi in zip(self.frames, offsets[:-1], offsets[1:]):
+                values = getattr(detections, name)
+                if values is not None and hi > lo:
+                    out[lo:hi] = values
+            return out
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                np.savez(
+                    out,
+                    version=np.int64(SIDECAR_VERSION),
+                    start=np.int64(self.start),
+                    offsets=offsets,
+                    tracked=np.array([d.ids is not None for d in self.frames], dtype=bool),
+                    xyxy=column("xyxy", 4, np.float32, 0.0),
+                    conf=column("conf", None, np.float32, 0.0),
+                    cls=column("cls", None, np.int64, -1),
+                    ids=column("ids", None, np.int64, -1),
+                )
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+
+# Read side of DetectionRecorder: per-frame Detections are zero-copy slices of the stored columns.
+class DetectionSidecar:
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        with np.load(self.path) as data:
+            if int(data["version"]) != SIDECAR_VERSION:
+                raise ValueError(f"{self.path} has sidecar version {int(data['version'])}, expected {SIDECAR_VERSION}.")
+            self.start = int(data["start"])
+            self.offsets = data["offsets"]
+            self.tracked = data["tracked"]
+            self.xyxy = data["xyxy"]
+            self.conf = data["conf"]
+            self.cls = data["cls"]
+            self.ids = data["ids"]
+
+    @classmethod
+    def open(cls, path: Optional[Path]) -> Optional["DetectionSidecar"]:
+        if path is None or not Path(path).exists():
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None  # unreadable or stale format: treat as a miss and let the caller re-detect
+
+    @property
+    def stop(self) -> int:
+        return self.start + len(self.tracked)
+
+    def __contains__(self, index: int) -> bool:
+        return self.start <= index < self.stop
+
+    def get(self, index: int) -> Detections:
+        if index not in self:
+            return Detections.empty()
+        frame = index - self.start
+        lo, hi = self.offsets[frame], self.offsets[frame + 1]
+        return Detections(
+            xyxy=self.xyxy[lo:hi],
+            conf=self.conf[lo:hi],
+            ids=self.ids[lo:hi] if self.tracked[frame] else None,
+            cls=self.cls[lo:hi],
+        )
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator
+
+import numpy as np
+
+
+class StageTimer:
+    def __init__(self, window: int = 256) -> None:
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+        # The last `window` samples per stage, for p50/p95 that follow the current load rather than the whole run.
+        self.window = window
+        self.samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.totals[name] += seconds
+            self.counts[name] += 1
+            self.samples[name].append(seconds)
+
+    def merge(self, summary: Dict[str, Dict[str, float]]) -> None:
+        with self._lock:
+            for name, stats in summary.items():
+                self.totals[name] += stats["total_s"]
+                self.counts[name] += int(stats["count"])
+
+    def mean_ms(self, name: str) -> float:
+        with self._lock:
+            count = self.counts.get(name, 0)
+            return 1000.0 * self.totals.get(name, 0.0) / count if count else 0.0
+
+    def percentile_ms(self, name: str, q: float) -> float:
+        with self._lock:
+            window = list(self.samples.get(name, ()))
+        return 1000.0 * float(np.percentile(window, q)) if window else 0.0
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            stats = {}
+            for name, total in self.totals.items():
+                count = self.counts[name]
+                stats[name] = {
+                    "count": count,
+                    "total_s": total,
+                    "ms_per_call": 1000.0 * total / count if count else 0.0,
+                    "calls_per_s": count / total if total > 0 else 0.0,
+                }
+                # Stages only known through merge() have totals but no samples, so no percentiles.
+                window = self.samples.get(name)
+                if window:
+                    p50, p95 = np.percentile(np.fromiter(window, dtype=np.float64), (50, 95))
+                    stats[name]["p50_ms"] = 1000.0 * float(p50)
+                    stats[name]["p95_ms"] = 1000.0 * float(p95)
+            return stats
+
+    def reset(self) -> None:
+        with self._lock:
+            self.totals.clear()
+            self.counts.clear()
+            self.samples.clear()
+
+
+def format_timings(timings: Dict[str, Dict[str, float]], frames: int = 0) -> str:
+    lines = []
+    for name in sorted(timings):
+        stats = timings[name]
+        line = f"{name:<18} {stats['count']:>7} calls {stats['ms_per_call']:>9.2f} ms/call"
+        if "p95_ms" in stats:
+            line += f" p50 {stats['p50_ms']:>8.2f} p95 {stats['p95_ms']:>8.2f} ms"
+        if frames and stats["total_s"] > 0:
+            line += f" {frames / stats['total_s']:>9.1f} frames/s"
+        lines.append(line)
+    return "\n".join(lines)
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import queue
+import threading
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from typing import Dict, Hashable, List, Optional, Tuple
 
 import cv2
 import numpy as np
 from ultralytics import YOLO
 
+from utils.timing import StageTimer
+from utils.video import VideoMeta
+
 
 @dataclass(frozen=True)
 class TrackSelection:
@@ -14,15 +19,71 @@ class TrackSelection:
     bbox: Tuple[int, int, int, int]
 
 
+@dataclass(frozen=True)
+class Detections:
+    xyxy: np.ndarray
+    conf: Optional[np.ndarray]
+    ids: Optional[np.ndarray]
+    cls: Optional[np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.xyxy)
+
+    @classmethod
+    def empty(cls) -> "Detections":
+        return cls(
+            xyxy=np.zeros((0, 4), np.float32),
+            conf=np.zeros(0, np.float32),
+            ids=np.zeros(0, np.int64),
+            cls=np.zeros(0, np.int64),
+        )
+
+    @classmethod
+    def from_result(cls, result) -> "Detections":
+        if isinstance(result, Detections):
+            return result
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls.empty()
+
+        # One device-to-host copy of [x1, y1, x2, y2, (id), conf, cls], then split into columns.
+        data = boxes.data.cpu().numpy()
+        tracked = data.shape[1] == 7
+        return cls(
+            xyxy=np.ascontiguousarray(data[:, :4], dtype=np.float32),
+            conf=np.ascontiguousarray(data[:, -2], dtype=np.float32),
+            ids=np.ascontiguousarray(data[:, 4], dtype=np.int64) if tracked else None,
+            cls=np.ascontiguousarray(data[:, -1], dtype=np.int64),
+        )
+
+
 def _boxes_from_result(result):
-    boxes = result.boxes
-    if boxes is None or len(boxes) == 0:
-        return [], [], []
+    detections = Detections.from_result(result)
+    return detections.xyxy, detections.conf, detections.ids
+
+
+def _bbox_tuple(box: np.ndarray) -> Tuple[int, int, int, int]:
+    x1, y1, x2, y2 = box
+    return int(x1), int(y1), int(x2), int(y2)
+
 
-    xyxy = boxes.xyxy.cpu().numpy()
-    conf = boxes.conf.cpu().numpy() if boxes.conf is not None else None
-    ids = boxes.id.cpu().numpy().astype(int) if boxes.id is not None else None
-    return xyxy, conf, ids
+def _centers(xyxy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    xyxy = xyxy.astype(np.float64)
+    return (xyxy[:, 0] + xyxy[:, 2]) / 2.0, (xyxy[:, 1] + xyxy[:, 3]) / 2.0
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = np.asarray(a, np.float64).reshape(-1, 4)
+    b = np.asarray(b, np.float64).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
 
 
 def get_candidate_boxes(result, max_candidates: int = 5) -> List[Tuple[Tuple[int, int, int, int], Optional[int], Optional[float]]]:
@@ -30,49 +91,35 @@ def get_candidate_boxes(result, max_candidates: int = 5) -> List[Tuple[Tuple[int
     if len(xyxy) == 0:
         return []
 
-    indices = list(range(len(xyxy)))
+    indices = np.arange(len(xyxy))
     if conf is not None:
-        indices.sort(key=lambda i: float(conf[i]), reverse=True)
+        indices = np.argsort(-conf, kind="stable")
     if max_candidates is not None:
         indices = indices[:max_candidates]
 
-    candidates = []
-    for i in indices:
-        x1, y1, x2, y2 = xyxy[i]
-        bbox = (int(x1), int(y1), int(x2), int(y2))
-        track_id = int(ids[i]) if ids is not None else None
-        score = float(conf[i]) if conf is not None else None
-        candidates.append((bbox, track_id, score))
-    return candidates
+    return [
+        (
+            _bbox_tuple(xyxy[i]),
+            int(ids[i]) if ids is not None else None,
+            float(conf[i]) if conf is not None else None,
+        )
+        for i in indices
+    ]
 
 
 def choose_target_from_click(result, click_x: int, click_y: int) -> Optional[TrackSelection]:
     xyxy, _, ids = _boxes_from_result(result)
-    if len(xyxy) == 0:
+    if len(xyxy) == 0 or ids is None:
         return None
 
-    best_idx = None
-    best_dist = None
-
-    for i, box in enumerate(xyxy):
-        x1, y1, x2, y2 = box
-        if click_x < x1 or click_x > x2 or click_y < y1 or click_y > y2:
-            continue
-        cx = (x1 + x2) / 2.0
-        cy = (y1 + y2) / 2.0
-        dist = (click_x - cx) ** 2 + (click_y - cy) ** 2
-        if best_dist is None or dist < best_dist:
-            best_dist = dist
-            best_idx = i
-
-    if best_idx is None:
+    inside = (xyxy[:, 0] <= click_x) & (click_x <= xyxy[:, 2]) & (xyxy[:, 1] <= click_y) & (click_y <= xyxy[:, 3])
+    if not inside.any():
         return None
 
-    if ids is None:
-        return None
-
-    x1, y1, x2, y2 = xyxy[best_idx]
-    return TrackSelection(track_id=int(ids[best_idx]), bbox=(int(x1), int(y1), int(x2), int(y2)))
+    cx, cy = _centers(xyxy)
+    dist = np.where(inside, (click_x - cx) ** 2 + (click_y - cy) ** 2, np.inf)
+    best_idx = int(np.argmin(dist))
+    return TrackSelection(track_id=int(ids[best_idx]), bbox=_bbox_tuple(xyxy[best_idx]))
 
 
 def find_bbox_for_track(result, track_id: int) -> Optional[Tuple[int, int, int, int]]:
@@ -80,25 +127,87 @@ def find_bbox_for_track(result, track_id: int) -> Optional[Tuple[int, int, int,
     if ids is None:
         return None
 
-    for i, t_id in enumerate(ids):
-        if int(t_id) == int(track_id):
-            x1, y1, x2, y2 = xyxy[i]
-            return int(x1), int(y1), int(x2), int(y2)
+    hits = np.flatnonzero(ids == int(track_id))
+    if len(hits) == 0:
+        return None
+    return _bbox_tuple(xyxy[hits[0]])
 
-    return None
 
+def _nearest_index(
+    xyxy: np.ndarray,
+    reference_bbox: Tuple[int, int, int, int],
+    max_distance: Optional[float],
+) -> Optional[int]:
+    rx1, ry1, rx2, ry2 = reference_bbox
+    cx, cy = _centers(xyxy)
+    dist = np.hypot((rx1 + rx2) / 2.0 - cx, (ry1 + ry2) / 2.0 - cy)
+    if max_distance is not None:
+        dist = np.where(dist > max_distance, np.inf, dist)
+    best_idx = int(np.argmin(dist))
+    return None if np.isinf(dist[best_idx]) else best_idx
 
-def blur_except_bbox(frame: np.ndarray, bbox: Optional[Tuple[int, int, int, int]]) -> np.ndarray:
-    blurred = cv2.GaussianBlur(frame, (35, 35), 0)
-    if bbox is None:
-        return blurred
 
+def find_bbox_and_id_by_overlap(
+    result,
+    reference_bbox: Optional[Tuple[int, int, int, int]],
+    min_iou: float = 0.3,
+) -> Tuple[Optional[Tuple[int, int, int, int]], Optional[int]]:
+    if reference_bbox is None:
+        return None, None
+
+    xyxy, _, ids = _boxes_from_result(result)
+    if len(xyxy) == 0:
+        return None, None
+
+    overlaps = iou_matrix(np.asarray(reference_bbox), xyxy)[0]
+    best_idx = int(np.argmax(overlaps))
+    if overlaps[best_idx] < min_iou:
+        return None, None
+    return _bbox_tuple(xyxy[best_idx]), int(ids[best_idx]) if ids is not None else None
+
+
+def _clip_bbox(frame: np.ndarray, bbox: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
     x1, y1, x2, y2 = bbox
     x1 = max(0, x1)
     y1 = max(0, y1)
     x2 = min(frame.shape[1] - 1, x2)
     y2 = min(frame.shape[0] - 1, y2)
+    return x1, y1, x2, y2
 
+
+def blur_background(
+    frame: np.ndarray,
+    ksize: int = 35,
+    downscale: int = 1,
+    dst: Optional[np.ndarray] = None,
+    scratch: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    ksize = max(3, ksize | 1)
+    if downscale <= 1:
+        return cv2.GaussianBlur(frame, (ksize, ksize), 0, dst=dst)
+
+    # Same sigma OpenCV derives for ksize, applied at 1/downscale resolution and upsampled.
+    sigma = 0.3 * ((ksize - 1) * 0.5 - 1) + 0.8
+    height, width = frame.shape[:2]
+    small_size = (max(1, width // downscale), max(1, height // downscale))
+    if scratch is not None and scratch.shape[:2] != small_size[::-1]:
+        scratch = None
+    small = cv2.resize(frame, small_size, dst=scratch, interpolation=cv2.INTER_AREA)
+    small = cv2.GaussianBlur(small, (0, 0), max(0.5, sigma / downscale), dst=small)
+    return cv2.resize(small, (width, height), dst=dst, interpolation=cv2.INTER_LINEAR)
+
+
+def blur_except_bbox(
+    frame: np.ndarray,
+    bbox: Optional[Tuple[int, int, int, int]],
+    blur_ksize: int = 35,
+    blur_downscale: int = 1,
+) -> np.ndarray:
+    blurred = blur_background(frame, blur_ksize, blur_downscale)
+    if bbox is None:
+        return blurred
+
+    x1, y1, x2, y2 = _clip_bbox(frame, bbox)
     if x2 <= x1 or y2 <= y1:
         return blurred
 
@@ -116,48 +225,223 @@ def enhance_low_light(frame: np.ndarray) -> np.ndarray:
     return cv2.fastNlMeansDenoisingColored(enhanced, None, 7, 7, 7, 21)
 
 
+class LowLightEnhancer:
+    def __init__(
+        self,
+        fast: bool = False,
+        luma_gate: Optional[float] = None,
+        timer: Optional[StageTimer] = None,
+    ) -> None:
+        self.fast = fast
+        self.luma_gate = luma_gate
+        self.timer = timer if timer is not None else StageTimer()
+        self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        self.frames = 0
+        self.skipped = 0
+
+    def mean_luma(self, frame: np.ndarray) -> float:
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (max(1, width // 8), max(1, height // 8)), interpolation=cv2.INTER_AREA)
+        return float(cv2.cvtColor(small, cv2.COLOR_BGR2LAB)[..., 0].mean())
+
+    def __call__(self, frame: np.ndarray) -> np.ndarray:
+        self.frames += 1
+        if self.luma_gate is not None:
+            with self.timer.stage("lowlight.gate"):
+                bright = self.mean_luma(frame) >= self.luma_gate
+            if bright:
+                self.skipped += 1
+                return frame
+
+        with self.timer.stage("lowlight.clahe"):
+            lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+            l_channel, a_channel, b_channel = cv2.split(lab)
+            cl = self.clahe.apply(l_channel)
+            enhanced = cv2.cvtColor(cv2.merge((cl, a_channel, b_channel)), cv2.COLOR_LAB2BGR)
+
+        with self.timer.stage("lowlight.denoise"):
+            if self.fast:
+                return cv2.bilateralFilter(enhanced, 5, 30, 30)
+            return cv2.fastNlMeansDenoisingColored(enhanced, None, 7, 7, 7, 21)
+
+
+def bbox_iou(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> float:
+    return float(iou_matrix(np.asarray(a), np.asarray(b))[0, 0])
+
+
+class GrabCutSegmenter:
+    def __init__(self, margin: float = 0.25, iterations: int = 1, reinit_iou: float = 0.5) -> None:
+        self.margin = margin
+        self.iterations = iterations
+        self.reinit_iou = reinit_iou
+        self.reset()
+
+    def reset(self) -> None:
+        self.track_id: Optional[int] = None
+        self.bbox: Optional[Tuple[int, int, int, int]] = None
+        self.bg_model: Optional[np.ndarray] = None
+        self.fg_model: Optional[np.ndarray] = None
+        self.inner_mask: Optional[np.ndarray] = None
+
+    def segment(
+        self,
+        frame: np.ndarray,
+        bbox: Tuple[int, int, int, int],
+        track_id: Optional[int] = None,
+    ) -> Optional[Tuple[Tuple[int, int], np.ndarray]]:
+        x1, y1, x2, y2 = _clip_bbox(frame, bbox)
+        if x2 <= x1 + 1 or y2 <= y1 + 1:
+            self.reset()
+            return None
+
+        pad_x = int((x2 - x1) * self.margin)
+        pad_y = int((y2 - y1) * self.margin)
+        rx1 = max(0, x1 - pad_x)
+        ry1 = max(0, y1 - pad_y)
+        rx2 = min(frame.shape[1], x2 + pad_x)
+        ry2 = min(frame.shape[0], y2 + pad_y)
+        crop = np.ascontiguousarray(frame[ry1:ry2, rx1:rx2])
+        rect = (x1 - rx1, y1 - ry1, x2 - x1, y2 - y1)
+
+        warm = (
+            self.bg_model is not None
+            and self.track_id == track_id
+            and self.bbox is not None
+            and bbox_iou(self.bbox, (x1, y1, x2, y2)) >= self.reinit_iou
+        )
+        try:
+            if warm:
+                # Carry last frame's segmentation into the new box and resume from its GMMs.
+                mask = np.full(crop.shape[:2], cv2.GC_BGD, np.uint8)
+                inner = cv2.resize(self.inner_mask, (rect[2], rect[3]), interpolation=cv2.INTER_NEAREST)
+                mask[rect[1] : rect[1] + rect[3], rect[0] : rect[0] + rect[2]] = np.where(
+                    inner == 1, cv2.GC_PR_FGD, cv2.GC_PR_BGD
+                )
+                warm = bool(inner.any())
+            if warm:
+                cv2.grabCut(crop, mask, None, self.bg_model, self.fg_model, self.iterations, cv2.GC_EVAL)
+            else:
+                mask = np.zeros(crop.shape[:2], np.uint8)
+                self.bg_model = np.zeros((1, 65), np.float64)
+                self.fg_model = np.zeros((1, 65), np.float64)
+                cv2.grabCut(crop, mask, rect, self.bg_model, self.fg_model, self.iterations, cv2.GC_INIT_WITH_RECT)
+        except cv2.error:
+            self.reset()
+            return None
+
+        fg = np.where((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD), 1, 0).astype("uint8")
+        self.track_id = track_id
+        self.bbox = (x1, y1, x2, y2)
+        self.inner_mask = fg[rect[1] : rect[1] + rect[3], rect[0] : rect[0] + rect[2]].copy()
+        return (rx1, ry1), fg
+
+
 def _grabcut_mask(frame: np.ndarray, bbox: Tuple[int, int, int, int], iterations: int = 1) -> Optional[np.ndarray]:
-    x1, y1, x2, y2 = bbox
-    x1 = max(0, x1)
-    y1 = max(0, y1)
-    x2 = min(frame.shape[1] - 1, x2)
-    y2 = min(frame.shape[0] - 1, y2)
-    if x2 <= x1 + 1 or y2 <= y1 + 1:
+    roi_mask = GrabCutSegmenter(iterations=iterations).segment(frame, bbox)
+    if roi_mask is None:
         return None
 
-    rect = (x1, y1, x2 - x1, y2 - y1)
+    (x0, y0), fg = roi_mask
     mask = np.zeros(frame.shape[:2], np.uint8)
-    bg_model = np.zeros((1, 65), np.float64)
-    fg_model = np.zeros((1, 65), np.float64)
-    cv2.grabCut(frame, mask, rect, bg_model, fg_model, iterations, cv2.GC_INIT_WITH_RECT)
-    mask2 = np.where((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD), 1, 0).astype("uint8")
-    return mask2
+    mask[y0 : y0 + fg.shape[0], x0 : x0 + fg.shape[1]] = fg
+    return mask
 
 
 def apply_focus_effect(
     frame: np.ndarray,
     bbox: Optional[Tuple[int, int, int, int]],
     use_grabcut: bool = False,
+    blur_ksize: int = 35,
+    blur_downscale: int = 1,
 ) -> np.ndarray:
     if bbox is None:
-        return cv2.GaussianBlur(frame, (35, 35), 0)
+        return blur_background(frame, blur_ksize, blur_downscale)
 
     if not use_grabcut:
-        return blur_except_bbox(frame, bbox)
+        return blur_except_bbox(frame, bbox, blur_ksize, blur_downscale)
 
     mask = _grabcut_mask(frame, bbox, iterations=1)
     if mask is None:
-        return blur_except_bbox(frame, bbox)
+        return blur_except_bbox(frame, bbox, blur_ksize, blur_downscale)
 
-    blurred = cv2.GaussianBlur(frame, (35, 35), 0)
-    output = blurred.copy()
-    output[mask == 1] = frame[mask == 1]
+    output = blur_background(frame, blur_ksize, blur_downscale)
+    cv2.copyTo(frame, mask, output)
     return output
 
 
-def draw_boxes(frame: np.ndarray, result) -> np.ndarray:
+class FocusCompositor:
+    def __init__(self, meta: VideoMeta, buffers: int = 2) -> None:
+        self.shape = (meta.height, meta.width, 3)
+        self._free: queue.Queue = queue.Queue()
+        for _ in range(max(1, buffers)):
+            self._free.put(np.empty(self.shape, np.uint8))
+        self._local = threading.local()
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> np.ndarray:
+        if stop is None:
+            return self._free.get()
+        # A failed effect or encode stage never hands its buffers back, so poll rather than wait forever.
+        while not stop.is_set():
+            try:
+                return self._free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise RuntimeError("Pipeline stopped while waiting for an output buffer.")
+
+    def release(self, buffer: np.ndarray) -> None:
+        self._free.put(buffer)
+
+    def compose(
+        self,
+        frame: np.ndarray,
+        bbox: Optional[Tuple[int, int, int, int]],
+        out: np.ndarray,
+        use_grabcut: bool = False,
+        roi_mask: Optional[Tuple[Tuple[int, int], np.ndarray]] = None,
+        blur_ksize: int = 35,
+        blur_downscale: int = 1,
+    ) -> np.ndarray:
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match compositor buffers {self.shape}.")
+
+        scratch = self._scratch(blur_downscale) if blur_downscale > 1 else None
+        blur_background(frame, blur_ksize, blur_downscale, dst=out, scratch=scratch)
+
+        if bbox is None:
+            return out
+        if roi_mask is None and use_grabcut:
+            roi_mask = GrabCutSegmenter().segment(frame, bbox)
+        if roi_mask is not None:
+            (x0, y0), fg = roi_mask
+            region = (slice(y0, y0 + fg.shape[0]), slice(x0, x0 + fg.shape[1]))
+            np.copyto(out[region], frame[region], where=fg[..., None] == 1)
+            return out
+
+        x1, y1, x2, y2 = _clip_bbox(frame, bbox)
+        if x2 > x1 and y2 > y1:
+            np.copyto(out[y1:y2, x1:x2], frame[y1:y2, x1:x2])
+        return out
+
+    def to_rgb(self, frame: np.ndarray) -> np.ndarray:
+        rgb = getattr(self._local, "rgb", None)
+        if rgb is None or rgb.shape != frame.shape:
+            rgb = np.empty(frame.shape, np.uint8)
+            self._local.rgb = rgb
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+
+    def _scratch(self, downscale: int) -> np.ndarray:
+        # Pyramid scratch is per thread so effect workers can share one compositor.
+        shape = (max(1, self.shape[0] // downscale), max(1, self.shape[1] // downscale), 3)
+        scratch = getattr(self._local, "scratch", None)
+        if scratch is None or scratch.shape != shape:
+            scratch = np.empty(shape, np.uint8)
+            self._local.scratch = scratch
+        return scratch
+
+
+def draw_boxes(frame: np.ndarray, result, inplace: bool = False) -> np.ndarray:
     xyxy, conf, ids = _boxes_from_result(result)
-    output = frame.copy()
+    output = frame if inplace else frame.copy()
     for i, box in enumerate(xyxy):
         x1, y1, x2, y2 = box.astype(int)
         label = ""
@@ -175,40 +459,139 @@ def load_model(model_name: str = "yolov8n.pt") -> YOLO:
     return YOLO(model_name)
 
 
-def find_bbox_by_proximity(
-    result,
-    reference_bbox: Optional[Tuple[int, int, int, int]],
-    max_distance: Optional[float] = None,
-) -> Optional[Tuple[int, int, int, int]]:
-    if reference_bbox is None:
-        return None
+_TRACK_CALLBACK_EVENTS = ("on_predict_start", "on_predict_postprocess_end")
 
-    xyxy, _, _ = _boxes_from_result(result)
-    if len(xyxy) == 0:
-        return None
 
-    rx1, ry1, rx2, ry2 = reference_bbox
-    ref_cx = (rx1 + rx2) / 2.0
-    ref_cy = (ry1 + ry2) / 2.0
+def _is_track_callback(callback) -> bool:
+    return getattr(getattr(callback, "func", callback), "__module__", "") == "ultralytics.trackers.track"
 
-    best_idx = None
-    best_dist = None
-    for i, box in enumerate(xyxy):
-        x1, y1, x2, y2 = box
-        cx = (x1 + x2) / 2.0
-        cy = (y1 + y2) / 2.0
-        dist = ((ref_cx - cx) ** 2 + (ref_cy - cy) ** 2) ** 0.5
-        if max_distance is not None and dist > max_distance:
-            continue
-        if best_dist is None or dist < best_dist:
-            best_dist = dist
-            best_idx = i
 
-    if best_idx is None:
-        return None
+def reset_tracker(model: YOLO) -> None:
+    # model.track() registers tracker callbacks on the model and keeps its ByteTrack instances on the predictor.
+    # Drop both so a later predict() is untracked again; the next track() re-registers a fresh tracker.
+    predictor = getattr(model, "predictor", None)
+    if predictor is not None and hasattr(predictor, "trackers"):
+        del predictor.trackers
+    callbacks = getattr(model, "callbacks", None) or {}
+    for event in _TRACK_CALLBACK_EVENTS:
+        if event in callbacks:
+            callbacks[event][:] = [cb for cb in callbacks[event] if not _is_track_callback(cb)]
 
-    x1, y1, x2, y2 = xyxy[best_idx]
-    return int(x1), int(y1), int(x2), int(y2)
+
+class BatchTracker:
+    def __init__(self, model: YOLO, tracker: str = "bytetrack.yaml", conf: float = 0.1) -> None:
+        from ultralytics.trackers.byte_tracker import BYTETracker
+        from ultralytics.utils import IterableSimpleNamespace
+        from ultralytics.utils.checks import check_yaml
+
+        try:
+            from ultralytics.utils import YAML
+
+            yaml_load = YAML.load
+        except ImportError:  # ultralytics < 8.3.150
+            from ultralytics.utils import yaml_load
+
+        self.model = model
+        self.conf = conf
+        cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker)))
+        # model.track() builds its tracker with frame_rate=30 and conf=0.1; match both so IDs agree.
+        try:
+            self.tracker = BYTETracker(args=cfg, frame_rate=30)
+        except TypeError:  # newer ultralytics builds it from args alone, in model.track() too
+            self.tracker = BYTETracker(args=cfg)
+
+    def track(self, frames: List[np.ndarray]) -> List:
+        results = self.model.predict(frames, conf=self.conf, verbose=False)
+        return [self._associate(frame, result) for frame, result in zip(frames, results)]
+
+    def _associate(self, frame: np.ndarray, result):
+        import torch
+
+        # Mirrors ultralytics' on_predict_postprocess_end so results look like model.track() output; empty frames
+        # still go through update() so lost tracks age the same way.
+        det = result.boxes.cpu().numpy()
+        tracks = self.tracker.update(det, frame)
+        if len(tracks) == 0:
+            return result[:0] if self._unconfirmed() else result
+        idx = tracks[:, -1].astype(int)
+        result = result[idx]
+        result.update(boxes=torch.as_tensor(tracks[:, :-1], device=result.boxes.data.device))
+        return result
+
+    def _unconfirmed(self) -> bool:
+        # model.track() hides a frame's boxes while any new track is still waiting to be confirmed.
+        return any(not t.is_activated for t in self.tracker.tracked_stracks)
+
+
+# Crop and full-frame detections feed the same ByteTrack instance, so IDs carry across both.
+class RoiTracker(BatchTracker):
+    def __init__(
+        self,
+        model: YOLO,
+        tracker: str = "bytetrack.yaml",
+        conf: float = 0.1,
+        margin: float = 1.5,
+        target_px: int = 128,
+        min_imgsz: int = 160,
+        max_imgsz: int = 1280,
+    ) -> None:
+        super().__init__(model, tracker=tracker, conf=conf)
+        self.margin = margin
+        self.target_px = target_px
+        self.min_imgsz = min_imgsz
+        self.max_imgsz = max_imgsz
+
+    def region(self, frame: np.ndarray, bbox: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+        x1, y1, x2, y2 = _clip_bbox(frame, bbox)
+        size = max(x2 - x1, y2 - y1, 1)
+        pad = int(size * self.margin)
+        height, width = frame.shape[:2]
+        return max(0, x1 - pad), max(0, y1 - pad), min(width, x2 + pad), min(height, y2 + pad)
+
+    def imgsz(self, region: Tuple[int, int, int, int], bbox: Tuple[int, int, int, int]) -> int:
+        # Scale the crop so the target's long side lands near target_px, whatever its size in the source.
+        crop = max(region[2] - region[0], region[3] - region[1])
+        target = max(bbox[2] - bbox[0], bbox[3] - bbox[1], 1)
+        size = int(np.ceil(crop * self.target_px / target / 32.0)) * 32
+        return min(self.max_imgsz, max(self.min_imgsz, size))
+
+    def track_roi(self, frame: np.ndarray, bbox: Tuple[int, int, int, int]) -> Detections:
+        x1, y1, x2, y2 = region = self.region(frame, bbox)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return Detections.empty()
+        crop = np.ascontiguousarray(frame[y1:y2, x1:x2])
+        result = self.model.predict(crop, conf=self.conf, imgsz=self.imgsz(region, bbox), verbose=False)[0]
+        det = result.boxes.cpu().numpy()
+        data = det.data
+        data[:, [0, 2]] += x1
+        data[:, [1, 3]] += y1
+        tracks = self.tracker.update(det, frame)
+        if len(tracks) == 0:
+            if len(det) == 0 or self._unconfirmed():
+                return Detections.empty()
+            return Detections(
+                xyxy=np.ascontiguousarray(data[:, :4], dtype=np.float32),
+                conf=np.ascontiguousarray(data[:, -2], dtype=np.float32),
+                ids=None,
+                cls=np.ascontiguousarray(data[:, -1], dtype=np.int64),
+            )
+        # Track rows are [x1, y1, x2, y2, id, score, cls, idx]; returned as Detections since a Result would
+        # clip the boxes to the crop's shape.
+        return Detections(
+            xyxy=np.ascontiguousarray(tracks[:, :4], dtype=np.float32),
+            conf=np.ascontiguousarray(tracks[:, 5], dtype=np.float32),
+            ids=np.ascontiguousarray(tracks[:, 4], dtype=np.int64),
+            cls=np.ascontiguousarray(tracks[:, 6], dtype=np.int64),
+        )
+
+
+def find_bbox_by_proximity(
+    result,
+    reference_bbox: Optional[Tuple[int, int, int, int]],
+    max_distance: Optional[float] = None,
+) -> Optional[Tuple[int, int, int, int]]:
+    bbox, _ = find_bbox_and_id_by_proximity(result, reference_bbox, max_distance)
+    return bbox
 
 
 def find_bbox_and_id_by_proximity(
@@ -223,29 +606,33 @@ def find_bbox_and_id_by_proximity(
     if len(xyxy) == 0:
         return None, None
 
-    rx1, ry1, rx2, ry2 = reference_bbox
-    ref_cx = (rx1 + rx2) / 2.0
-    ref_cy = (ry1 + ry2) / 2.0
-
-    best_idx = None
-    best_dist = None
-    for i, box in enumerate(xyxy):
-        x1, y1, x2, y2 = box
-        cx = (x1 + x2) / 2.0
-        cy = (y1 + y2) / 2.0
-        dist = ((ref_cx - cx) ** 2 + (ref_cy - cy) ** 2) ** 0.5
-        if max_distance is not None and dist > max_distance:
-            continue
-        if best_dist is None or dist < best_dist:
-            best_dist = dist
-            best_idx = i
-
+    best_idx = _nearest_index(xyxy, reference_bbox, max_distance)
     if best_idx is None:
         return None, None
 
-    x1, y1, x2, y2 = xyxy[best_idx]
     new_id = int(ids[best_idx]) if ids is not None else None
-    return (int(x1), int(y1), int(x2), int(y2)), new_id
+    return _bbox_tuple(xyxy[best_idx]), new_id
+
+
+class EmbeddingCache:
+    def __init__(self, frame_id: Optional[Hashable] = None) -> None:
+        self.frame_id = frame_id
+        self._embeddings: Dict[Tuple[int, int, int, int], np.ndarray] = {}
+
+    @staticmethod
+    def key(bbox: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+        return tuple(int(round(float(v))) for v in bbox)
+
+    def advance(self, frame_id: Hashable) -> None:
+        if frame_id != self.frame_id:
+            self.frame_id = frame_id
+            self._embeddings.clear()
+
+    def get(self, bbox: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
+        return self._embeddings.get(self.key(bbox))
+
+    def put(self, bbox: Tuple[int, int, int, int], embedding: np.ndarray) -> None:
+        self._embeddings[self.key(bbox)] = embedding
 
 
 class AppearanceMatcher:
@@ -277,7 +664,8 @@ class AppearanceMatcher:
         except Exception:
             self.mode = "hist"
 
-    def embed_crop(self, frame: np.ndarray, bbox: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
+    @staticmethod
+    def _crop(frame: np.ndarray, bbox: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
         x1, y1, x2, y2 = bbox
         x1 = max(0, x1)
         y1 = max(0, y1)
@@ -289,28 +677,83 @@ class AppearanceMatcher:
         crop = frame[y1:y2, x1:x2]
         if crop.size == 0:
             return None
+        return crop
+
+    @staticmethod
+    def _hist_embedding(crop: np.ndarray) -> np.ndarray:
+        hsv = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1, 2], None, [8, 8, 8], [0, 180, 0, 256, 0, 256])
+        hist = cv2.normalize(hist, hist).flatten()
+        return hist.astype(np.float32)
+
+    def embed_crop(
+        self,
+        frame: np.ndarray,
+        bbox: Tuple[int, int, int, int],
+        cache: Optional[EmbeddingCache] = None,
+    ) -> Optional[np.ndarray]:
+        embeddings = self.embed_batch(frame, [bbox], cache=cache)
+        if not embeddings[0].any():
+            return None
+        return embeddings[0]
+
+    def embed_batch(
+        self,
+        frame: np.ndarray,
+        bboxes: List[Tuple[int, int, int, int]],
+        cache: Optional[EmbeddingCache] = None,
+    ) -> np.ndarray:
+        # Rows for boxes that cannot be cropped are left as zeros.
+        if cache is None:
+            return self._embed_batch(frame, bboxes)
+
+        rows = [cache.get(bbox) for bbox in bboxes]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if missing:
+            computed = self._embed_batch(frame, [bboxes[i] for i in missing])
+            for i, row in zip(missing, computed):
+                if row.any():
+                    cache.put(bboxes[i], row)
+                    rows[i] = row
+
+        dim = next((row.shape[0] for row in rows if row is not None), 0)
+        embeddings = np.zeros((len(bboxes), dim), dtype=np.float32)
+        for i, row in enumerate(rows):
+            if row is not None:
+                embeddings[i] = row
+        return embeddings
+
+    def _embed_batch(self, frame: np.ndarray, bboxes: List[Tuple[int, int, int, int]]) -> np.ndarray:
+        crops = [self._crop(frame, bbox) for bbox in bboxes]
+        valid = [i for i, crop in enumerate(crops) if crop is not None]
 
         if self.mode == "hist":
-            hsv = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV)
-            hist = cv2.calcHist([hsv], [0, 1, 2], None, [8, 8, 8], [0, 180, 0, 256, 0, 256])
-            hist = cv2.normalize(hist, hist).flatten()
-            return hist.astype(np.float32)
+            embeddings = np.zeros((len(bboxes), 512), dtype=np.float32)
+            for i in valid:
+                embeddings[i] = self._hist_embedding(crops[i])
+            return embeddings
+
+        if not valid:
+            return np.zeros((len(bboxes), 0), dtype=np.float32)
 
         import torch
 
-        crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
-        crop = cv2.resize(crop, (224, 224), interpolation=cv2.INTER_LINEAR)
-        tensor = torch.from_numpy(crop).to(self.device).permute(2, 0, 1).float() / 255.0
+        batch = np.stack(
+            [
+                cv2.resize(cv2.cvtColor(crops[i], cv2.COLOR_BGR2RGB), (224, 224), interpolation=cv2.INTER_LINEAR)
+                for i in valid
+            ]
+        )
+        tensor = torch.from_numpy(batch).to(self.device).permute(0, 3, 1, 2).float() / 255.0
         tensor = (tensor - self.mean) / self.std
-        tensor = tensor.unsqueeze(0)
 
         with torch.no_grad():
-            feats = self.backbone(tensor).squeeze()
-        if feats.ndim == 0:
-            return None
-        vec = feats.flatten()
-        vec = vec / (vec.norm() + 1e-6)
-        return vec.cpu().numpy()
+            feats = self.backbone(tensor).flatten(1)
+        feats = feats / (feats.norm(dim=1, keepdim=True) + 1e-6)
+
+        embeddings = np.zeros((len(bboxes), feats.shape[1]), dtype=np.float32)
+        embeddings[valid] = feats.cpu().numpy()
+        return embeddings
 
     @staticmethod
     def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
@@ -323,17 +766,20 @@ class AppearanceMatcher:
         frame: np.ndarray,
         candidates: List[Tuple[Tuple[int, int, int, int], Optional[int], Optional[float]]],
         target_embedding: np.ndarray,
+        cache: Optional[EmbeddingCache] = None,
     ) -> Tuple[Optional[Tuple[int, int, int, int]], Optional[int], float]:
-        best_bbox = None
-        best_id = None
-        best_sim = -1.0
-        for bbox, track_id, _ in candidates:
-            emb = self.embed_crop(frame, bbox)
-            if emb is None:
-                continue
-            sim = float(np.dot(emb, target_embedding))
-            if sim > best_sim:
-                best_sim = sim
-                best_bbox = bbox
-                best_id = track_id
+        if not candidates:
+            return None, None, -1.0
+
+        embeddings = self.embed_batch(frame, [bbox for bbox, _, _ in candidates], cache=cache)
+        valid = np.flatnonzero(embeddings.any(axis=1))
+        if len(valid) == 0:
+            return None, None, -1.0
+
+        sims = embeddings[valid] @ target_embedding
+        best = int(np.argmax(sims))
+        best_sim = float(sims[best])
+        if best_sim <= -1.0:
+            return None, None, -1.0
+        best_bbox, best_id, _ = candidates[valid[best]]
         return best_bbox, best_id, best_sim
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+UPLOAD_CACHE_DIR = Path(tempfile.gettempdir()) / "bullseye_uploads"
+CHUNK_SIZE = 8 * 1024 * 1024
+# Files touched this recently are treated as in use by some session and never evicted.
+UPLOAD_GRACE_S = 15 * 60
+
+
+def content_hash(data, chunk_size: int = CHUNK_SIZE) -> str:
+    view = memoryview(data).cast("B")
+    digest = hashlib.sha256()
+    for offset in range(0, len(view), chunk_size):
+        digest.update(view[offset : offset + chunk_size])
+    return digest.hexdigest()
+
+
+def file_hash(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def spool_upload(
+    data,
+    suffix: str = "",
+    cache_dir: Path = UPLOAD_CACHE_DIR,
+    max_bytes: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Tuple[str, str]:
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    key = content_hash(data, chunk_size)
+    path = cache_dir / f"{key}{suffix.lower()}"
+    if path.exists():
+        os.utime(path)
+    else:
+        view = memoryview(data).cast("B")
+        fd, tmp_name = tempfile.mkstemp(dir=cache_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for offset in range(0, len(view), chunk_size):
+                    out.write(view[offset : offset + chunk_size])
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    if max_bytes is not None:
+        evict_uploads(cache_dir, max_bytes, keep=path)
+    return key, str(path)
+
+
+def evict_uploads(
+    cache_dir: Path,
+    max_bytes: int,
+    keep: Optional[Path] = None,
+    grace_s: float = UPLOAD_GRACE_S,
+) -> None:
+    # Walks subdirectories too, so detection sidecars stored next to the uploads share the same budget.
+    # Sessions touch their upload on every rerun, so the grace window covers files other sessions are still using.
+    recent = time.time() - grace_s
+    entries = []
+    for entry in Path(cache_dir).rglob("*"):
+        if not entry.is_file() or entry.suffix == ".part":
+            continue
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry))
+
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, entry in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        if keep is not None and entry == keep:
+            continue
+        if mtime >= recent:
+            break
+        # Readers that already opened an evicted file keep their handle on POSIX.
+        entry.unlink(missing_ok=True)
+        total -= size
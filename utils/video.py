@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Generator, Tuple
+from typing import Generator, Hashable, Optional, Tuple
 
 import cv2
+import numpy as np
 
 
 @dataclass(frozen=True)
@@ -31,10 +35,14 @@ def read_frame_at(cap: cv2.VideoCapture, index: int) -> Tuple[bool, "cv2.Mat"]:
     return cap.read()
 
 
-def iter_frames(cap: cv2.VideoCapture, start: int = 0) -> Generator[Tuple[int, "cv2.Mat"], None, None]:
+def iter_frames(
+    cap: cv2.VideoCapture,
+    start: int = 0,
+    stop: Optional[int] = None,
+) -> Generator[Tuple[int, "cv2.Mat"], None, None]:
     cap.set(cv2.CAP_PROP_POS_FRAMES, start)
     idx = start
-    while True:
+    while stop is None or idx < stop:
         ok, frame = cap.read()
         if not ok:
             break
@@ -45,3 +53,169 @@ def iter_frames(cap: cv2.VideoCapture, start: int = 0) -> Generator[Tuple[int, "
 def make_video_writer(path: str, meta: VideoMeta) -> cv2.VideoWriter:
     fourcc = cv2.VideoWriter_fourcc(*"mp4v")
     return cv2.VideoWriter(path, fourcc, meta.fps, (meta.width, meta.height))
+
+
+class FrameCache:
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._frames: "OrderedDict[Tuple[Hashable, int], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: Tuple[Hashable, int]) -> bool:
+        with self._lock:
+            return key in self._frames
+
+    def get(self, video_key: Hashable, index: int) -> Optional[np.ndarray]:
+        with self._lock:
+            frame = self._frames.get((video_key, index))
+            if frame is not None:
+                self._frames.move_to_end((video_key, index))
+            return frame
+
+    def put(self, video_key: Hashable, index: int, frame: np.ndarray) -> None:
+        if frame.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._frames.pop((video_key, index), None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._frames[(video_key, index)] = frame
+            self.nbytes += frame.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+
+class FrameReader:
+    def __init__(
+        self,
+        path: str,
+        max_forward_grab: int = 60,
+        cache: Optional[FrameCache] = None,
+        video_key: Optional[Hashable] = None,
+    ) -> None:
+        self.path = path
+        self.max_forward_grab = max_forward_grab
+        self.cache = cache
+        self.video_key = video_key if video_key is not None else path
+        self.cap, self.meta = open_video(path)
+        self.position: Optional[int] = 0
+        self._lock = threading.Lock()
+        self._prefetch_thread: Optional[threading.Thread] = None
+
+    def read(self, index: int) -> Tuple[bool, "cv2.Mat"]:
+        # Cached frames are shared between reruns, so callers must not draw on them in place.
+        if self.cache is not None:
+            frame = self.cache.get(self.video_key, index)
+            if frame is not None:
+                return True, frame
+        with self._lock:
+            # The prefetch thread may have decoded it while we waited; decoding again would seek backwards.
+            if self.cache is not None:
+                frame = self.cache.get(self.video_key, index)
+                if frame is not None:
+                    return True, frame
+            ok, frame = self._decode(index)
+            if ok and self.cache is not None:
+                self.cache.put(self.video_key, index, frame)
+        return ok, frame
+
+    def prefetch(self, start: int, count: int = 1, step: int = 1) -> None:
+        if self.cache is None:
+            return
+        if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+            return
+        indices = [start + i * step for i in range(count)]
+        indices = [i for i in indices if 0 <= i < self.meta.frame_count and (self.video_key, i) not in self.cache]
+        if not indices:
+            return
+        self._prefetch_thread = threading.Thread(target=self._prefetch, args=(indices,), daemon=True)
+        self._prefetch_thread.start()
+
+    def _prefetch(self, indices) -> None:
+        for index in indices:
+            ok, _ = self.read(index)
+            if not ok:
+                break
+
+    def _decode(self, index: int) -> Tuple[bool, "cv2.Mat"]:
+        gap = None if self.position is None else index - self.position
+        if gap is None or gap < 0 or gap > self.max_forward_grab:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        else:
+            # Short forward hops decode sequentially instead of paying a keyframe seek.
+            for _ in range(gap):
+                if not self.cap.grab():
+                    self.position = None
+                    return False, None
+        ok, frame = self.cap.read()
+        self.position = index + 1 if ok else None
+        return ok, frame
+
+    def release(self) -> None:
+        if self._prefetch_thread is not None:
+            self._prefetch_thread.join()
+        with self._lock:
+            self.cap.release()
+
+
+# Keeps only the newest camera frame, grabbed on a background thread that frees the device after
+# idle_timeout seconds without a read(), so an abandoned session does not hold the camera.
+class CameraStream:
+    def __init__(self, source=0, idle_timeout: float = 10.0) -> None:
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            self.cap.release()
+            raise ValueError("Could not open webcam. Make sure your camera is connected and not in use by another app.")
+        # Drivers that honour it stop queueing stale frames on their side too.
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.idle_timeout = idle_timeout
+        self.seq = 0
+        self.failed = False
+        self._frame: Optional[np.ndarray] = None
+        self._last_read = time.monotonic()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                ok, frame = self.cap.read()
+                with self._cond:
+                    if not ok:
+                        self.failed = True
+                        self._cond.notify_all()
+                        return
+                    self._frame = frame
+                    self.seq += 1
+                    self._cond.notify_all()
+                    if time.monotonic() - self._last_read > self.idle_timeout:
+                        return
+        finally:
+            self.cap.release()
+
+    def read(self, after: int = 0, timeout: float = 2.0) -> Tuple[int, Optional[np.ndarray]]:
+        # Newest frame with a sequence number above `after`, waiting up to `timeout` for one.
+        with self._cond:
+            self._last_read = time.monotonic()
+            self._cond.wait_for(lambda: self.seq > after or self.failed or not self.alive, timeout=timeout)
+            if self.seq <= after:
+                return self.seq, None
+            return self.seq, self._frame
+
+    def release(self) -> None:
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)